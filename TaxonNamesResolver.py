@@ -12,6 +12,12 @@ import logging
 import platform
 from datetime import datetime
 from taxon_names_resolver import Resolver
+from taxon_names_resolver import ResolverPool
+from taxon_names_resolver import shard_tools
+from taxon_names_resolver.sieve_tools import Sieve
+from taxon_names_resolver.sieve_tools import MinScore
+from taxon_names_resolver.writer_tools import ResultWriter
+from taxon_names_resolver.resolver import readTerms
 from taxon_names_resolver import __version__ as version
 from taxon_names_resolver import __doc__ as details
 
@@ -34,6 +40,66 @@ def parseArgs():
     parser.add_argument("-datasource", "-d", help="taxonomic datasource by \
 which names will be resolved (default NCBI)")
     parser.add_argument("-taxonid", "-t", help="parent taxonomic ID")
+    parser.add_argument("-excludeid", help="taxonomic ID of a clade whose \
+names are not to be returned")
+    parser.add_argument("-concurrency", "-c", type=int, default=1,
+                        help="number of chunks of names to query at once \
+(default 1)")
+    parser.add_argument("-dsconcurrency", type=int, default=1,
+                        help="number of other datasources to search at once \
+for alternative names (default 1)")
+    parser.add_argument("--earlystop", help="stop searching other \
+datasources once every name has an alternative name", action="store_true")
+    parser.add_argument("-maxsources", type=int, help="maximum number of \
+other datasources to search for alternative names, best first")
+    parser.add_argument("-cachedir", help="directory in which to cache \
+results between runs")
+    parser.add_argument("--refresh", help="search names that went \
+unresolved in previous runs through every datasource again",
+                        action="store_true")
+    parser.add_argument("--post", help="send names in the request body, \
+allowing larger chunks", action="store_true")
+    parser.add_argument("-taxonomy", help="resolve names offline against a \
+directory of NCBI names.dmp and nodes.dmp files (or an index built from them) \
+instead of the GNR")
+    parser.add_argument("-server", default="http://resolver.globalnames.org",
+                        help="base URL of the GNR, e.g. a mirror or mock \
+server")
+    parser.add_argument("-rate", type=float, help="maximum queries sent to \
+the GNR per second")
+    parser.add_argument("-namerate", type=float, help="maximum names sent to \
+the GNR per second")
+    parser.add_argument("-ratelock", help="lock file through which resolvers \
+on this machine share the rate limits")
+    parser.add_argument("-batch", help="folder of .txt files of names, each \
+a job resolved together with the others, results in resolved_names/<file>")
+    parser.add_argument("-shards", type=int, help="split names into this \
+many shards by hash, resolve each in a separate process and merge results \
+as csv")
+    parser.add_argument("-shard", type=int, help="with -shards, resolve only \
+this shard (counting from 0), e.g. on one of several hosts sharing a folder")
+    parser.add_argument("--merge", help="with -shards, only merge results of \
+shards already resolved", action="store_true")
+    parser.add_argument("-processes", type=int, help="with -shards, number \
+of shards resolved at once (default all)")
+    parser.add_argument("-resume", help="output folder of a previous run to \
+resume from its checkpoint (names file not needed)")
+    parser.add_argument("--compact", help="hold results in a compact store \
+to save memory on large lists", action="store_true")
+    parser.add_argument("-minscore", type=float, help="minimum score of \
+records returned, names with none are unresolved")
+    parser.add_argument("-archive", default="json", choices=["json", "ndjson",
+                        "off"], help="format of raw results archive, json \
+lists, gzipped ndjson or off (default json)")
+    parser.add_argument("-format", default="csv", choices=["csv", "tsv",
+                        "ndjson"], help="format of search results (default \
+csv)")
+    parser.add_argument("--gzip", help="gzip search results",
+                        action="store_true")
+    parser.add_argument("--allrecords", help="write every record of each \
+name kept by the sieve, not only the best", action="store_true")
+    parser.add_argument("--stream", help="write names to the results as \
+they are resolved, so they can be read during the run", action="store_true")
     parser.add_argument("--verbose", help="increase output verbosity",
                         action="store_true")
     parser.add_argument('--details', help='display information about the \
@@ -65,11 +131,38 @@ if __name__ == '__main__':
         print('\nThis is TaxonNamesResolver, version: [{0}]'.format(version))
         print(details)
         sys.exit()
-    if not args.names:
+    if (args.shard is not None or args.merge or args.processes) and \
+            not args.shards:
+        print('-shard, --merge and -processes need -shards!')
+        print('Type `TaxonNamesResolver.py -h` for help.')
+        sys.exit()
+    if args.shards and (args.format != 'csv' or args.gzip or args.stream):
+        print('Shards are merged as csv, -format, --gzip and --stream cannot '
+              'be used with -shards!')
+        print('Type `TaxonNamesResolver.py -h` for help.')
+        sys.exit()
+    if args.allrecords and (args.shards or args.batch):
+        print('--allrecords cannot be used with -shards or -batch!')
+        print('Type `TaxonNamesResolver.py -h` for help.')
+        sys.exit()
+    if not args.names and (args.shards and not args.merge or
+                           not args.resume and not args.batch and
+                           not args.merge):
         print('No names file provided!')
         print('Type `TaxonNamesResolver.py -h` for help.')
         sys.exit()
-    if not os.path.isfile(args.names):
+    if args.resume and not os.path.isdir(args.resume):
+        print('[{0}] could not be found!'.format(args.resume))
+        sys.exit()
+    if args.resume and not args.names and not os.path.isfile(
+            os.path.join(args.resume, 'checkpoint.json')):
+        print('No checkpoint to resume in [{0}], provide a names file!'.format(
+            args.resume))
+        sys.exit()
+    if args.batch and not os.path.isdir(args.batch):
+        print('[{0}] could not be found!'.format(args.batch))
+        sys.exit()
+    if args.names and not os.path.isfile(args.names):
         print('[{0}] could not be found!'.format(args.names))
         sys.exit()
     print('\n' + description + '\n')
@@ -90,9 +183,52 @@ if __name__ == '__main__':
         logger.addHandler(console)
     # log system info
     logSysInfo()
-    resolver = Resolver(args.names, datasource, args.taxonid)
-    resolver.main()
-    resolver.write()
+    kwargs = dict(refresh=args.refresh, concurrency=args.concurrency,
+                  post=args.post, cachedir=args.cachedir,
+                  ds_concurrency=args.dsconcurrency, early_stop=args.earlystop,
+                  max_sources=args.maxsources, taxonomy=args.taxonomy,
+                  server=args.server, requests_per_sec=args.rate,
+                  names_per_sec=args.namerate, rate_lockfile=args.ratelock,
+                  archive=None if args.archive == 'off' else args.archive,
+                  compact=args.compact, exclude=args.excludeid)
+    if args.minscore is not None:
+        kwargs['sieve'] = Sieve(filters=[MinScore(args.minscore)])
+    if args.shards:
+        outdir = os.path.join(os.getcwd(), 'resolved_names')
+        if args.merge:
+            shard_tools.mergeShards(args.shards, outdir)
+        elif args.shard is not None:
+            shard_tools.resolveShard(readTerms(args.names), args.shard,
+                                     args.shards, outdir,
+                                     datasource=datasource,
+                                     taxon_id=args.taxonid, **kwargs)
+        else:
+            shard_tools.resolveShards(readTerms(args.names), args.shards,
+                                      outdir, processes=args.processes,
+                                      datasource=datasource,
+                                      taxon_id=args.taxonid, **kwargs)
+    elif args.batch:
+        exclude = kwargs.pop('exclude')
+        pool = ResolverPool(datasource, logger=logger, **kwargs)
+        for filename in sorted(os.listdir(args.batch)):
+            if filename.endswith('.txt'):
+                pool.add(os.path.splitext(filename)[0],
+                         input_file=os.path.join(args.batch, filename),
+                         taxon_id=args.taxonid, exclude=exclude)
+        pool.run()
+    else:
+        if args.stream:
+            outdir = os.path.join(os.getcwd(), args.resume or
+                                  'resolved_names')
+            kwargs['stream'] = ResultWriter(outdir, fmt=args.format,
+                                            compress=args.gzip,
+                                            all_records=args.allrecords)
+        resolver = Resolver(args.names, datasource, args.taxonid,
+                            resume=args.resume, **kwargs)
+        resolver.main()
+        if not args.stream:
+            resolver.write(fmt=args.format, compress=args.gzip,
+                           all_records=args.allrecords)
     logEndTime()
     if not args.verbose:
         print('\nComplete\n')
@@ -33,17 +33,17 @@ resolver = Resolver(terms=terms, datasource="NCBI", logger=logger)
 resolver.main()  # resolve!
 
 # CREATE TAXDICT
-# extract the unique names for each term ('idents', query_name is best as it is
-#  guaranteed to be unique)
-idents = resolver.retrieve('query_name')
-# extract the lists of names for all known parental taxonomic groups for each
-#  term ('lineages', e.g. Homo, Primate, Mammalia)
-lineages = resolver.retrieve('classification_path')
-# for Taxonomic IDs instead of names, use:
-#  lineages = resolver.retrieve('classification_path_ids')
-# extract the lists of corresponding rank names for 'lineages' ('ranks', e.g.
-#  species, genus etc.) for each entity
-ranks = resolver.retrieve('classification_path_ranks')
+# extract, in one pass over the results, the unique names for each term
+#  ('idents', query_name is best as it is guaranteed to be unique), the lists of
+#  names for all known parental taxonomic groups for each term ('lineages', e.g.
+#  Homo, Primate, Mammalia) and the lists of corresponding rank names for
+#  'lineages' ('ranks', e.g. species, genus etc.) for each entity
+idents, lineages, ranks = resolver.retrieveMany(
+    ['query_name', 'classification_path', 'classification_path_ranks'])
+# for Taxonomic IDs instead of names, use 'classification_path_ids'
+# N.B. the lineages and ranks are read-only tuples shared with the resolver,
+#  a single term can be retrieved as a list of lists with e.g.:
+#  lineages = resolver.retrieve('classification_path')
 # optional extra data slots are also possible, for example a list of 1s and 0s
 # it could be anything, just as long as its in the same order
 extra = [1, 1, 1, 0, 0, 1, 1, 0, 1, 0]
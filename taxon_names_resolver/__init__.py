@@ -5,6 +5,7 @@
 # Create namespace
 from __future__ import absolute_import
 from taxon_names_resolver.resolver import Resolver
+from taxon_names_resolver.resolver import ResolverPool
 from taxon_names_resolver.manip_tools import TaxDict
 from taxon_names_resolver.manip_tools import taxTree
 __doc__ = '''
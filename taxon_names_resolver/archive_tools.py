@@ -0,0 +1,149 @@
+#! /usr/bin/env python
+"""
+Tools for archiving raw GNR results.
+"""
+from __future__ import absolute_import
+
+import gzip
+import json
+import threading
+from six.moves import queue
+
+
+# CLASSES
+class ArchiveWriter(object):
+    """Archive writer class: carry out archive writes in order on a \
+background thread, so archiving does not hold up querying. No more than \
+maxsize writes are held waiting."""
+
+    def __init__(self, logger, maxsize=100):
+        self.logger = logger
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, fn, *args):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run)
+                self._thread.daemon = True
+                self._thread.start()
+        self._queue.put((fn, args))
+
+    def _run(self):
+        while True:
+            fn, args = self._queue.get()
+            try:
+                fn(*args)
+            except Exception as errmsg:
+                self.logger.error('----- Archive error [{0}] -----'.format(
+                    errmsg))
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """Wait for all submitted writes to complete"""
+        self._queue.join()
+
+
+class NullArchive(object):
+    """Null archive class: archive nothing"""
+
+    def write(self, records):
+        pass
+
+    def close(self):
+        pass
+
+
+class Archive(object):
+    """Archive base class: records are copied, so they may be changed once \
+written, and passed to _write on the writer's thread if a writer is given."""
+
+    def __init__(self, writer=None):
+        self.writer = writer
+        self._lock = threading.Lock()
+
+    def write(self, records):
+        records = [dict(record) for record in records]
+        self._submit(self._write, records)
+
+    def close(self):
+        self._submit(self._close)
+
+    def _submit(self, fn, *args):
+        if self.writer is not None:
+            self.writer.submit(fn, *args)
+        else:
+            with self._lock:
+                fn(*args)
+
+    def _write(self, records):
+        pass
+
+    def _close(self):
+        pass
+
+
+class RawArchive(Archive):
+    """Raw archive class: write records to a JSON list file"""
+
+    def __init__(self, path, writer=None):
+        super(RawArchive, self).__init__(writer)
+        self.path = path
+        self.count = 0
+        self._file = None
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'w')
+            self._file.write('[')
+
+    def _write(self, records):
+        self._open()
+        for record in records:
+            if self.count > 0:
+                self._file.write(', ')
+            json.dump(record, self._file)
+            self.count += 1
+
+    def _close(self):
+        self._open()
+        self._file.write(']')
+        self._file.close()
+
+
+class NDJSONArchive(Archive):
+    """NDJSON archive class: write records to a gzipped file of one JSON \
+record per line, flushed after each chunk. Any earlier file is replaced \
+unless append."""
+
+    def __init__(self, path, writer=None, append=False):
+        super(NDJSONArchive, self).__init__(writer)
+        self.path = path
+        self.append = append
+        self._file = None
+
+    def _write(self, records):
+        if self._file is None:
+            self._file = gzip.open(self.path, 'ab' if self.append else 'wb')
+        for record in records:
+            self._file.write((json.dumps(record) + '\n').encode('utf8'))
+        self._file.flush()
+
+    def _close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class SinkArchive(Archive):
+    """Sink archive class: pass each chunk of records to a function, \
+sink(nsearch, records)"""
+
+    def __init__(self, sink, nsearch, writer=None):
+        super(SinkArchive, self).__init__(writer)
+        self.sink = sink
+        self.nsearch = nsearch
+
+    def _write(self, records):
+        self.sink(self.nsearch, records)
@@ -0,0 +1,319 @@
+#! /usr/bin/env python
+"""
+Asynchronous tools for interacting with the GNR (Python 3.5+).
+"""
+from __future__ import absolute_import
+
+import asyncio
+import json
+import six
+from six.moves import urllib
+from .gnr_tools import GnrResolver
+from .http_tools import RetryPolicy
+from .http_tools import GnrQueryError
+from .local_tools import LocalGnrResolver
+
+
+# FUNCTIONS
+async def _fetch(url, data=None, max_redirects=5):
+    # minimal HTTP/1.1 GET, or POST of data (url-encoded string), over
+    #  asyncio streams, return body as bytes
+    for _ in range(max_redirects + 1):
+        parts = urllib.parse.urlsplit(url)
+        secure = parts.scheme == 'https'
+        port = parts.port or (443 if secure else 80)
+        reader, writer = await asyncio.open_connection(
+            parts.hostname, port, ssl=True if secure else None)
+        try:
+            path = parts.path or '/'
+            if parts.query:
+                path += '?' + parts.query
+            if data is None:
+                request = ('GET {0} HTTP/1.1\r\nHost: {1}\r\n'
+                           'Accept: application/json\r\n'
+                           'Connection: close\r\n\r\n').format(
+                               path, parts.netloc)
+                payload = b''
+            else:
+                payload = data.encode('utf8')
+                request = ('POST {0} HTTP/1.1\r\nHost: {1}\r\n'
+                           'Accept: application/json\r\n'
+                           'Content-Type: application/x-www-form-urlencoded'
+                           '\r\nContent-Length: {2}\r\n'
+                           'Connection: close\r\n\r\n').format(
+                               path, parts.netloc, len(payload))
+            writer.write(request.encode('latin-1') + payload)
+            await writer.drain()
+            head = await reader.readuntil(b'\r\n\r\n')
+            lines = head.decode('latin-1').split('\r\n')
+            status = int(lines[0].split()[1])
+            headers = {}
+            for line in lines[1:]:
+                if ':' in line:
+                    key, value = line.split(':', 1)
+                    headers[key.strip().lower()] = value.strip()
+            # servers may keep the connection open, read no further than
+            #  the body
+            if headers.get('transfer-encoding', '').lower() == 'chunked':
+                body = await _readChunked(reader)
+            elif 'content-length' in headers:
+                body = await reader.readexactly(
+                    int(headers['content-length']))
+            else:
+                body = await reader.read()
+        finally:
+            writer.close()
+        if status in (301, 302, 303, 307, 308) and 'location' in headers:
+            url = urllib.parse.urljoin(url, headers['location'])
+            if status == 303:
+                data = None
+            continue
+        if status >= 400:
+            raise IOError('HTTP Error {0}'.format(status))
+        return body
+    raise IOError('Too many redirects')
+
+
+async def _readChunked(reader):
+    # read a chunked transfer-encoded body from reader
+    res = []
+    while True:
+        size = await reader.readline()
+        size = int(size.split(b';')[0], 16)
+        if size == 0:
+            break
+        res.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+    # skip trailers, up to a blank line
+    while (await reader.readline()).strip():
+        pass
+    return b''.join(res)
+
+
+async def asyncReadJSON(url, logger, max_check=6, waittime=30, policy=None,
+                        limiter=None, nnames=0, data=None, timeout=60):
+    '''Return JSON object from URL, POSTing data (url-encoded string) if \
+given, awaiting between retries as the \
+RetryPolicy decides, by default every waittime seconds up to max_check times. \
+The policy's CircuitBreaker is not used. Every try of a query of nnames awaits \
+its turn with the RateLimiter if given, and gives up after timeout seconds.'''
+    if policy is None:
+        policy = RetryPolicy(max_tries=max_check, base=waittime, cap=waittime,
+                             jitter=False)
+    attempt = 0
+    # try, try and try again ....
+    while True:
+        if limiter is not None:
+            await asyncio.sleep(limiter.reserve(nnames))
+        try:
+            body = await asyncio.wait_for(_fetch(url, data), timeout)
+            res = json.loads(body.decode('utf8'))
+            return res
+        except Exception as errmsg:
+            logger.info('----- GNR error [{0}] : retrying ----'.format(errmsg))
+        delay = policy.retry(attempt)
+        if delay is None:
+            break
+        await asyncio.sleep(delay)
+        policy.record(delay)
+        attempt += 1
+    logger.error('----- Returning nothing : GNR server may be down -----')
+    return None
+
+
+async def amain(resolver, inflight=10):
+    '''Search and sieve query names of a Resolver asynchronously'''
+    loop = asyncio.get_event_loop()
+    if isinstance(resolver._res, LocalGnrResolver):
+        # nothing to wait on but the local disk
+        await loop.run_in_executor(None, resolver.main)
+        return
+    ares = getattr(resolver, '_ares', None)
+    if ares is None or ares.inflight != inflight:
+        ares = AsyncGnrResolver.fromResolver(resolver._res, inflight=inflight)
+        resolver._ares = ares
+    # data sources may need fetching, do not block the loop
+    await loop.run_in_executor(None, lambda: (ares.Id, ares.otherIds))
+    for search_terms, prelim, sink in resolver._searches():
+        # archives are numbered on, as the checkpoint records
+        ares.write_counter = resolver._res.write_counter
+        await ares.search(search_terms, prelim=prelim, sink=sink)
+        resolver._res.write_counter = ares.write_counter
+    await loop.run_in_executor(None, ares.flush)
+    ares.report()
+
+
+# CLASSES
+class AsyncGnrResolver(GnrResolver):
+    """Asynchronous GNR resolver class: search the GNR with awaitable \
+queries, no more than `inflight` at once"""
+
+    def __init__(self, logger, datasource='NCBI', inflight=10, **kwargs):
+        super(AsyncGnrResolver, self).__init__(logger, datasource=datasource,
+                                               **kwargs)
+        self.inflight = max(1, int(inflight))
+        self._semaphore = None
+        self._loop = None
+
+    @classmethod
+    def fromResolver(cls, res, inflight=10):
+        '''Return AsyncGnrResolver with the configuration of GnrResolver \
+res, sharing its cache, data sources, retry policy, rate limiter and \
+archive writer'''
+        ares = cls.__new__(cls)
+        ares.__dict__.update(res.__dict__)
+        ares.inflight = max(1, int(inflight))
+        ares._semaphore = None
+        ares._loop = None
+        return ares
+
+    async def search(self, terms, prelim=True, sink=None):
+        """Search terms against GNR. If prelim = False, search other datasources \
+for alternative names (i.e. synonyms) with which to search main datasource.\
+Return JSON object. If sink is given, records are instead passed to it a chunk \
+at a time as they arrive."""
+        res = []
+        if sink is None:
+            sink = res.extend
+        if prelim:  # preliminary search
+            archive = self._archive()
+
+            def store(records):
+                archive.write(records)
+                sink(records)
+            await self._resolve(terms, self.Id, store)
+            archive.close()
+            return res
+        else:  # search other DSs for alt names, search DS with these
+            archive = self._archive()
+            alt_terms, sources = await self._searchOthers(terms, archive)
+            archive.close()
+            if len(alt_terms) == 0:
+                if self.stats is not None:
+                    self.stats.save()
+                return False
+            else:
+                # search the main source again with alt_terms
+                # replace names in json
+                terms = [each[1] for each in alt_terms]  # unzip
+                archive = self._archive()
+
+                def replace(records):
+                    archive.write(records)
+                    self._credit(records, sources)
+                    sink(self._replaceSupStrNames(records, alt_terms))
+                await self._resolve(terms, self.Id, replace)
+                archive.close()
+                if self.stats is not None:
+                    self.stats.save()
+                return res
+
+    async def _searchOthers(self, terms, archive):
+        # query other data sources, a wave of ds_concurrency at a time; if
+        #  early_stop, stop once every term has an alternative name
+        # archive records, return alternative names and the data sources of
+        #  each alternative name
+        ds_ids = self._orderOthers()
+        size = self.ds_concurrency
+
+        async def resolve(ds_id):
+            found = []
+
+            def parse(records):
+                archive.write(records)
+                found.extend(self._parseNames(records))
+            await self._resolve(terms, [ds_id], parse)
+            return found
+
+        alt_terms = set()
+        sources = {}
+        remaining = set(terms)
+        for i in range(0, len(ds_ids), size):
+            wave = ds_ids[i:i + size]
+            founds = await asyncio.gather(*[resolve(ds_id) for ds_id in wave])
+            for ds_id, found in zip(wave, founds):
+                self._tally(ds_id, found, sources)
+                alt_terms.update(found)
+                remaining -= set([each[0] for each in found])
+            if self.early_stop and not remaining and i + size < len(ds_ids):
+                self.logger.info('All terms have alternative names, skipping '
+                                 '[{0}] data sources'.format(
+                                     len(ds_ids) - i - size))
+                break
+        return list(alt_terms), sources
+
+    async def _resolve(self, terms, ds_id, sink=None):
+        # Take results from the cache if any, query server for the rest. If
+        #  sink, pass records to it a chunk at a time, else return records in
+        #  the order of terms
+        if self.cache is None:
+            return await self._resolveChunks(terms, ds_id, sink)
+        if sink is not None:
+            misses = self._sinkCached(terms, ds_id, sink)
+            if misses:
+                await self._resolveChunks(misses, ds_id, sink)
+            return
+        cached = self.cache.get(terms, ds_id)
+        misses = [term for term in terms if term not in cached]
+        self.logger.info('Found [{0}] of [{1}] names in cache'.format(
+            len(terms) - len(misses), len(terms)))
+        fetched = await self._resolveChunks(misses, ds_id) if misses else []
+        return self._merge(terms, cached, fetched)
+
+    async def _resolveChunks(self, terms, ds_id, sink=None):
+        # Query server in chunks, gather keeps the order of chunks. With a
+        #  sink, records of each chunk are passed to it as the chunk arrives
+        #  and dropped
+        chunk_size = self.sizer.size
+        chunks = []
+        lower = 0
+        while lower < len(terms):
+            upper = min(len(terms), lower + chunk_size)
+            chunks.append((lower, upper))
+            lower = upper
+        res = await asyncio.gather(*[self._limited(terms, lower, upper,
+                                                   ds_id, sink) for lower,
+                                     upper in chunks])
+        if sink is not None:
+            return
+        res = [record for search in res for record in search['data']]
+        return(res)
+
+    async def _limited(self, terms, lower, upper, ds_id, sink=None):
+        # query chunk once there is room in flight, a semaphore is bound to
+        #  the loop it is first used on so each run's loop gets its own
+        loop = asyncio.get_event_loop()
+        if self._semaphore is None or self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.inflight)
+            self._loop = loop
+        async with self._semaphore:
+            self.logger.info('Querying [{0}] to [{1}] of [{2}]'.
+                             format(lower, upper, len(terms)))
+            search = await self._query(terms[lower:upper], ds_id)
+        if search is None:
+            raise GnrQueryError('No results for [{0}] to [{1}] of [{2}] '
+                                'names, GNR server may be down'.format(
+                                    lower, upper, len(terms)))
+        if self.cache is not None:
+            self.cache.put(search['data'], ds_id)
+        if sink is not None:
+            sink(search['data'])
+            return
+        return search
+
+    async def _query(self, terms, data_source_ids):
+        ds_ids = [str(id) for id in data_source_ids]
+        terms = [urllib.parse.quote(six.text_type(t).encode('utf8')) for t in
+                 terms]
+        url = self.server + '/name_resolvers.json'
+        params = ('data_source_ids=' + '|'.join(ds_ids) + '&' +
+                  'resolve_once=false&' + 'names=' + '|'.join(terms))
+        if self.post:
+            return await asyncReadJSON(url, self.logger, policy=self.policy,
+                                       limiter=self.limiter,
+                                       nnames=len(terms), data=params,
+                                       timeout=self.pool.timeout)
+        return await asyncReadJSON(url + '?' + params, self.logger,
+                                   policy=self.policy, limiter=self.limiter,
+                                   nnames=len(terms),
+                                   timeout=self.pool.timeout)
@@ -0,0 +1,240 @@
+#! /usr/bin/env python
+"""
+Tools for caching GNR results on disk.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+# FUNCTIONS
+def normalise(name):
+    '''Return name with surrounding and repeated whitespace removed'''
+    return ' '.join(name.split())
+
+
+# CLASSES
+class ResultCache(object):
+    """Result cache class: store the raw GNR results of each (normalised \
+name, data source ID) in an SQLite file in cachedir, so that names already \
+searched are not sent again. Entries expire after ttl seconds, swept every \
+sweep_every puts, the least recently used are evicted beyond max_entries."""
+
+    def __init__(self, cachedir, ttl=2592000, max_entries=1000000,
+                 sweep_every=100):
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        self.path = os.path.join(cachedir, 'results.sqlite')
+        self.ttl = ttl  # 30 days by default
+        self.max_entries = max_entries
+        self.sweep_every = sweep_every
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        with self._conn:
+            self._conn.execute('CREATE TABLE IF NOT EXISTS results (name TEXT,'
+                               ' ds_id INTEGER, stored REAL, used REAL, '
+                               'results TEXT, PRIMARY KEY (name, ds_id))')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS used_idx ON '
+                               'results (used)')
+            self._conn.execute('CREATE INDEX IF NOT EXISTS stored_idx ON '
+                               'results (stored)')
+        # entries are counted as they are put rather than on each put
+        self._count = self._conn.execute(
+            'SELECT COUNT(*) FROM results').fetchone()[0]
+        self._puts = 0
+
+    def get(self, terms, ds_ids):
+        """Return dictionary of term: record for terms with fresh results \
+for all ds_ids"""
+        names = list(set([normalise(t) for t in terms]))
+        now = time.time()
+        found = {}
+        with self._lock:
+            # keep below SQLite's limit on number of variables
+            for i in range(0, len(names), 500):
+                batch = names[i:i + 500]
+                rows = self._conn.execute(
+                    'SELECT name, ds_id, results FROM results WHERE stored > '
+                    '? AND name IN ({0})'.format(','.join('?' * len(batch))),
+                    [now - self.ttl] + batch)
+                for name, ds_id, results in rows:
+                    found.setdefault(name, {})[ds_id] = results
+            hits = [name for name in names if name in found and
+                    all([ds_id in found[name] for ds_id in ds_ids])]
+            with self._conn:
+                self._conn.executemany(
+                    'UPDATE results SET used = ? WHERE name = ?',
+                    [(now, name) for name in hits])
+        hits = set(hits)
+        cached = {}
+        for term in terms:
+            name = normalise(term)
+            if name not in hits:
+                continue
+            results = [result for ds_id in ds_ids for result in
+                       json.loads(found[name][ds_id])]
+            record = {'supplied_name_string': term}
+            if len(results) > 0:
+                record['results'] = results
+            cached[term] = record
+        with self._lock:
+            self.hits += len(cached)
+            self.misses += len(terms) - len(cached)
+        return cached
+
+    def put(self, records, ds_ids):
+        """Store results of records searched against ds_ids"""
+        now = time.time()
+        rows = {}
+        for record in records:
+            name = normalise(record['supplied_name_string'])
+            results = record.get('results', [])
+            for ds_id in ds_ids:
+                if len(ds_ids) > 1:
+                    ds_results = [result for result in results if
+                                  result.get('data_source_id') == ds_id]
+                else:
+                    ds_results = results
+                rows[(name, ds_id)] = (name, ds_id, now, now,
+                                       json.dumps(ds_results))
+        names = list(set([name for name, _ in rows]))
+        with self._lock:
+            with self._conn:
+                self._count += len(rows) - self._held(names, ds_ids)
+                self._conn.executemany('INSERT OR REPLACE INTO results VALUES '
+                                       '(?, ?, ?, ?, ?)', list(rows.values()))
+                self._puts += 1
+                if self._puts >= self.sweep_every:
+                    self._sweep()
+                if self._count > self.max_entries:
+                    self._evict()
+
+    def _held(self, names, ds_ids):
+        # number of entries already held of names against ds_ids
+        held = 0
+        ds_marks = ','.join('?' * len(ds_ids))
+        for i in range(0, len(names), 500):
+            batch = names[i:i + 500]
+            held += self._conn.execute(
+                'SELECT COUNT(*) FROM results WHERE ds_id IN ({0}) AND name '
+                'IN ({1})'.format(ds_marks, ','.join('?' * len(batch))),
+                list(ds_ids) + batch).fetchone()[0]
+        return held
+
+    def _sweep(self):
+        # drop expired entries, recount those left as other processes may
+        #  share the file
+        self._conn.execute('DELETE FROM results WHERE stored <= ?',
+                           (time.time() - self.ttl,))
+        self._count = self._conn.execute(
+            'SELECT COUNT(*) FROM results').fetchone()[0]
+        self._puts = 0
+
+    def _evict(self):
+        # drop least recently used beyond max_entries
+        if self._count > self.max_entries:
+            self._conn.execute('DELETE FROM results WHERE rowid IN (SELECT '
+                               'rowid FROM results ORDER BY used LIMIT ?)',
+                               (self._count - self.max_entries,))
+            self._count = self.max_entries
+
+    def report(self):
+        return 'Cache hits [{0}], misses [{1}]'.format(self.hits, self.misses)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class DataSourceStats(object):
+    """Data source stats class: record the yield of each data source in the \
+search for alternative names (alternative names found, and how many of these \
+then resolved in the primary data source) in a JSON file in cachedir, and \
+order data sources by it."""
+
+    def __init__(self, cachedir):
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        self.path = os.path.join(cachedir, 'data_source_stats.json')
+        self.stats = {}
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as infile:
+                self.stats = json.load(infile)
+        self._lock = threading.Lock()
+
+    def record(self, ds_id, queried=0, alt_names=0, resolved=0):
+        with self._lock:
+            stats = self.stats.setdefault(str(ds_id), {
+                'queried': 0, 'alt_names': 0, 'resolved': 0})
+            stats['queried'] += queried
+            stats['alt_names'] += alt_names
+            stats['resolved'] += resolved
+
+    def order(self, ds_ids):
+        """Return ds_ids by descending yield: those that have yielded first, \
+then those never queried, then those that have never yielded"""
+        def key(ds_id):
+            stats = self.stats.get(str(ds_id))
+            if stats is None:
+                return (1, 0, 0)
+            if stats['alt_names'] == 0:
+                return (2, 0, 0)
+            return (0, -stats['resolved'], -stats['alt_names'])
+        return sorted(ds_ids, key=key)
+
+    def save(self):
+        with self._lock:
+            with open(self.path, 'w') as outfile:
+                json.dump(self.stats, outfile, indent=1, sort_keys=True)
+
+
+class NegativeCache(object):
+    """Negative cache class: remember names that could not be resolved in a \
+JSON file in cachedir for ttl seconds, so that they need not go through the \
+fallback searches again. Names unresolved in one scope (e.g. data source and \
+taxonomic filter) are kept apart from those of any other."""
+
+    def __init__(self, cachedir, ttl=2592000, scope=None):
+        if not os.path.isdir(cachedir):
+            os.makedirs(cachedir)
+        filename = 'unresolved.json'
+        if scope is not None:
+            digest = hashlib.md5(json.dumps(scope, sort_keys=True).encode(
+                'utf8')).hexdigest()
+            filename = 'unresolved_{0}.json'.format(digest[:16])
+        self.path = os.path.join(cachedir, filename)
+        self.ttl = ttl  # 30 days by default
+        self.names = {}
+        if os.path.isfile(self.path):
+            with open(self.path, 'r') as infile:
+                self.names = json.load(infile)
+
+    def known(self, names):
+        """Return set of names known to be unresolvable"""
+        expiry = time.time() - self.ttl
+        return set([name for name in names if
+                    self.names.get(normalise(name), 0) > expiry])
+
+    def add(self, names):
+        now = time.time()
+        for name in names:
+            self.names[normalise(name)] = now
+
+    def discard(self, names):
+        for name in names:
+            self.names.pop(normalise(name), None)
+
+    def save(self):
+        # drop expired names
+        expiry = time.time() - self.ttl
+        self.names = dict([(name, stored) for name, stored in
+                           self.names.items() if stored > expiry])
+        with open(self.path, 'w') as outfile:
+            json.dump(self.names, outfile)
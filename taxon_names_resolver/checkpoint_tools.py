@@ -0,0 +1,76 @@
+#! /usr/bin/env python
+"""
+Tools for checkpointing the progress of a Resolver.
+"""
+from __future__ import absolute_import
+
+import json
+import os
+import threading
+
+
+# CLASSES
+class Checkpoint(object):
+    """Checkpoint class: keep the progress of a Resolver in outdir, as a \
+snapshot of its search state and store at the start of each pass and a \
+journal of the records of each chunk searched since. Both are forced to disk \
+as they are written, so a run that dies can be resumed from them."""
+
+    def __init__(self, outdir):
+        if not os.path.isdir(outdir):
+            os.makedirs(outdir)
+        self.path = os.path.join(outdir, 'checkpoint.json')
+        self.journal_path = os.path.join(outdir, 'checkpoint_chunks.ndjson')
+        self._journal = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Return the last snapshot and the chunks of records journaled \
+since, (None, []) if there is no checkpoint"""
+        if not os.path.isfile(self.path):
+            return None, []
+        with open(self.path, 'r') as infile:
+            state = json.load(infile)
+        chunks = []
+        if os.path.isfile(self.journal_path):
+            with open(self.journal_path, 'r') as infile:
+                for line in infile:
+                    try:
+                        chunks.append(json.loads(line))
+                    except ValueError:
+                        # last chunk was cut short
+                        break
+        return state, chunks
+
+    def save(self, state):
+        """Save snapshot of state, starting a new journal"""
+        with self._lock:
+            tmp_path = self.path + '.tmp'
+            with open(tmp_path, 'w') as outfile:
+                json.dump(state, outfile)
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            # os.replace overwrites atomically, Python 2 only has os.rename
+            getattr(os, 'replace', os.rename)(tmp_path, self.path)
+            if self._journal is not None:
+                self._journal.close()
+            self._journal = open(self.journal_path, 'w')
+
+    def record(self, records):
+        """Journal a chunk of records"""
+        with self._lock:
+            if self._journal is None:
+                self._journal = open(self.journal_path, 'a')
+            self._journal.write(json.dumps(records) + '\n')
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    def clear(self):
+        """Remove checkpoint once the run is complete"""
+        with self._lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            for path in [self.path, self.journal_path]:
+                if os.path.isfile(path):
+                    os.remove(path)
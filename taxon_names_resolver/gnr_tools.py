@@ -6,95 +6,389 @@ Tools for interacting with the GNR.
 """
 from __future__ import absolute_import
 
+import sys
 import time
 import contextlib
+from array import array
 import json
 import os
+import threading
 import six
-from six.moves import urllib
+from multiprocessing.pool import ThreadPool
+from six.moves import queue, urllib
+from .http_tools import ConnectionPool
+from .http_tools import CircuitBreaker
+from .http_tools import RetryPolicy
+from .http_tools import RateLimiter
+from .http_tools import GnrQueryError
+from .cache_tools import ResultCache
+from .cache_tools import DataSourceStats
+from .archive_tools import ArchiveWriter
+from .archive_tools import NullArchive
+from .archive_tools import RawArchive
+from .archive_tools import NDJSONArchive
+from .archive_tools import SinkArchive
 
 
 # FUNCTIONS
-def safeReadJSON(url, logger, max_check=6, waittime=30):
-    '''Return JSON object from URL'''
-    counter = 0
+def safeReadJSON(url, logger, max_check=6, waittime=30, pool=None, data=None,
+                 policy=None, limiter=None, nnames=0):
+    '''Return JSON object from URL, through a ConnectionPool if given. If data \
+(url-encoded string) is given it is POSTed. Failed reads are retried as the \
+RetryPolicy decides, by default every waittime seconds up to max_check times. \
+Tries failing while the policy's CircuitBreaker holds queries do not count. \
+Every try of a query of nnames waits its turn with the RateLimiter if given.'''
+    if policy is None:
+        policy = RetryPolicy(max_tries=max_check, base=waittime, cap=waittime,
+                             jitter=False)
+    if pool is None and data is not None:
+        data = data.encode('utf8')
+    attempt = 0
     # try, try and try again ....
-    while counter < max_check:
+    while True:
+        policy.acquire()
+        if limiter is not None:
+            limiter.acquire(nnames)
         try:
-            with contextlib.closing(urllib.request.urlopen(url)) as f:
-                res = json.loads(f.read().decode('utf8'))
+            if pool is not None:
+                res = json.loads(pool.request(url, data=data).decode('utf8'))
+            else:
+                with contextlib.closing(urllib.request.urlopen(url, data)) as f:
+                    res = json.loads(f.read().decode('utf8'))
+            policy.success()
             return res
         except Exception as errmsg:
             logger.info('----- GNR error [{0}] : retrying ----'.format(errmsg))
-        counter += 1
-        time.sleep(waittime)
+            if policy.failure(errmsg):
+                # held until a probe finds the server up again
+                continue
+        delay = policy.retry(attempt)
+        if delay is None:
+            break
+        policy.wait(delay)
+        attempt += 1
     logger.error('----- Returning nothing : GNR server may be down -----')
     return None
 
 
 # CLASSES
 class GnrDataSources(object):
-    """GNR data sources class: extract IDs for specified data sources."""
+    """GNR data sources class: extract IDs for specified data sources. The \
+catalog is downloaded on first need, kept for the rest of the process and, if \
+cachedir is given, saved there for ttl seconds."""
+
+    # catalogs downloaded by this process, by URL
+    _catalogs = {}
+    _lock = threading.Lock()
+
+    def __init__(self, logger, pool=None, cachedir=None, ttl=86400,
+                 policy=None, server='http://resolver.globalnames.org',
+                 limiter=None):
+        self.url = server + '/data_sources.json'
+        self.limiter = limiter
+        self.logger = logger
+        self.pool = pool
+        self.policy = policy
+        self.cachedir = cachedir
+        self.ttl = ttl  # one day by default
+        self._available = None
+        self._index = None
 
-    def __init__(self, logger):
-        url = 'http://resolver.globalnames.org/data_sources.json'
-        self.available = safeReadJSON(url, logger)
+    @property
+    def available(self):
+        if self._available is None:
+            with self._lock:
+                self._available = self._catalogs.get(self.url)
+                if self._available is None:
+                    self._available = self._load()
+                if self._available is not None:
+                    self._catalogs[self.url] = self._available
+        return self._available
+
+    def _load(self):
+        # read catalog from cachedir if fresh, else download and save it
+        catalog_file = None
+        if self.cachedir:
+            catalog_file = os.path.join(self.cachedir, 'data_sources.json')
+            if os.path.isfile(catalog_file) and \
+                    time.time() - os.path.getmtime(catalog_file) < self.ttl:
+                with open(catalog_file, 'r') as infile:
+                    return json.load(infile)
+        available = safeReadJSON(self.url, self.logger, pool=self.pool,
+                                 policy=self.policy, limiter=self.limiter)
+        if catalog_file and available is not None:
+            if not os.path.isdir(self.cachedir):
+                os.makedirs(self.cachedir)
+            with open(catalog_file, 'w') as outfile:
+                json.dump(available, outfile)
+        return available
 
     def summary(self):
         # see what sources are available
         return [dict(id=ds['id'], title=ds['title']) for ds in self.available]
 
     def byName(self, names, invert=False):
+        if self._index is None:
+            # IDs in catalog order and by title
+            ids = [ds['id'] for ds in self.available]
+            index = {}
+            for ds in self.available:
+                index.setdefault(ds['title'], []).append(ds['id'])
+            self._ids, self._index = ids, index
+        if isinstance(names, six.string_types):
+            names = [names]
+        selected = set([ds_id for name in set(names) for ds_id in
+                        self._index.get(name, [])])
         if invert:
-            return [ds['id'] for ds in self.available if not ds['title'] in
-                    names]
+            return [ds_id for ds_id in self._ids if ds_id not in selected]
         else:
-            return [ds['id'] for ds in self.available if ds['title'] in names]
+            return [ds_id for ds_id in self._ids if ds_id in selected]
+
+
+class ChunkSizer(object):
+    """Chunk sizer class: grow the number of names sent per query while \
+responses are fast, shrink it when they are slow or fail."""
+
+    def __init__(self, logger, size=100, minimum=10, maximum=1000, target=15):
+        self.logger = logger
+        self.minimum = minimum
+        self.maximum = maximum
+        self.size = max(minimum, min(maximum, size))
+        self.target = target  # seconds a query should take
+        self.latencies = []  # of every query recorded
+        self._lock = threading.Lock()
+
+    def record(self, nnames, latency, success):
+        """Adjust size from a query of nnames that took latency seconds"""
+        with self._lock:
+            self.latencies.append(latency)
+            size = self.size
+            if not success or latency > self.target:
+                size = max(self.minimum, size // 2)
+            elif latency < self.target / 2. and nnames >= size:
+                # only full chunks tell us a bigger one would be fast
+                size = min(self.maximum, size + size // 2)
+            if size != self.size:
+                self.logger.info('Chunk size set to [{0}] names'.format(size))
+                self.size = size
 
 
 class GnrResolver(object):
     """GNR resolver class: search the GNR"""
 
-    def __init__(self, logger, datasource='NCBI'):
+    def __init__(self, logger, datasource='NCBI', concurrency=1, pool=None,
+                 post=False, chunk_size=100, max_chunk_size=1000,
+                 policy=None, cachedir=None, cache_ttl=2592000,
+                 cache_size=1000000, ds_concurrency=1, early_stop=False,
+                 max_sources=None, archive='json', archive_dir=None,
+                 server='http://resolver.globalnames.org', limiter=None,
+                 requests_per_sec=None, names_per_sec=None,
+                 rate_lockfile=None):
+        """Search datasource, and other data sources for names it lacks:
+- concurrency: chunks queried at once, sharing pool, a ConnectionPool
+- post: send names in the request body, allowing chunks beyond 100 names
+- chunk_size, max_chunk_size: names per query to start from and at most
+- policy: RetryPolicy shared by all queries of the run
+- cachedir: cache results there for cache_ttl seconds, at most cache_size \
+entries, sending only names missing from it
+- ds_concurrency: other data sources searched at once
+- early_stop: stop once every term has an alternative name
+- max_sources: most other data sources searched, best yield first
+- archive: 'json', 'ndjson', archive(nsearch, records) or None, written \
+to archive_dir on a background thread
+- server: base URL of the GNR
+- requests_per_sec, names_per_sec: rates held to, shared with other \
+processes through rate_lockfile, or by the RateLimiter limiter"""
         self.logger = logger
-        ds = GnrDataSources(logger)
+        self.server = server
+        if limiter is None and (requests_per_sec or names_per_sec):
+            limiter = RateLimiter(requests_per_sec, names_per_sec,
+                                  lockfile=rate_lockfile)
+        self.limiter = limiter
+        # number of chunks to query at once, 1 is sequential
+        self.concurrency = max(1, int(concurrency))
+        # number of other data sources to query at once
+        self.ds_concurrency = max(1, int(ds_concurrency))
+        self.early_stop = early_stop
+        self.max_sources = max_sources
+        if pool is None:
+            pool = ConnectionPool(maxsize=self.concurrency *
+                                  self.ds_concurrency)
+        self.pool = pool
         self.write_counter = 1
-        self.Id = ds.byName(datasource)
-        self.otherIds = ds.byName(datasource, invert=True)
-        self.waittime = 600  # wait ten minutes if server fail
-        self.max_check = 6  # search for up to an hour
+        # numbers of ndjson archives to append to, those of a resumed search
+        self.appending = set()
+        if archive not in (None, 'json', 'ndjson') and not callable(archive):
+            raise ValueError('Unknown archive [{0}]'.format(archive))
+        self.archive = archive
+        self.archive_dir = archive_dir
+        self.writer = ArchiveWriter(logger)
+        self.waittime = 600  # wait no more than ten minutes if server fail
+        self.max_check = 6  # try each query up to six times
+        if policy is None:
+            policy = RetryPolicy(max_tries=self.max_check, cap=self.waittime,
+                                 breaker=CircuitBreaker(logger))
+        self.policy = policy
+        # data source IDs are looked up on first need
+        self.datasource = datasource
+        self._ds = GnrDataSources(logger, pool=self.pool, cachedir=cachedir,
+                                  policy=self.policy, server=server,
+                                  limiter=self.limiter)
+        self._Id = None
+        self._otherIds = None
+        # GET requests are limited to 100 names by URL length
+        self.post = post
+        if not post:
+            max_chunk_size = min(max_chunk_size, 100)
+        self.sizer = ChunkSizer(logger, size=chunk_size,
+                                maximum=max_chunk_size)
+        self.cachedir = cachedir
+        self.cache = None
+        self.stats = None
+        if cachedir:
+            self.cache = ResultCache(cachedir, ttl=cache_ttl,
+                                     max_entries=cache_size)
+            self.stats = DataSourceStats(cachedir)
+
+    @property
+    def Id(self):
+        if self._Id is None:
+            self._Id = self._ds.byName(self.datasource)
+        return self._Id
+
+    @Id.setter
+    def Id(self, value):
+        self._Id = value
+
+    @property
+    def otherIds(self):
+        if self._otherIds is None:
+            self._otherIds = self._ds.byName(self.datasource, invert=True)
+        return self._otherIds
 
-    def search(self, terms, prelim=True):
+    @otherIds.setter
+    def otherIds(self, value):
+        self._otherIds = value
+
+    def search(self, terms, prelim=True, sink=None):
         """Search terms against GNR. If prelim = False, search other datasources \
 for alternative names (i.e. synonyms) with which to search main datasource.\
-Return JSON object."""
+Return JSON object. If sink is given, records are instead passed to it a chunk \
+at a time as they arrive."""
         # TODO: There are now lots of additional data sources, make additional
         # searching optional (11/01/2017)
+        res = []
+        if sink is None:
+            sink = res.extend
         if prelim:  # preliminary search
-            res = self._resolve(terms, self.Id)
-            self._write(res)
+            archive = self._archive()
+
+            def store(records):
+                archive.write(records)
+                sink(records)
+            self._resolve(terms, self.Id, store)
+            archive.close()
             return res
         else:  # search other DSs for alt names, search DS with these
             # quick fix: https://github.com/DomBennett/TaxonNamesResolver/issues/5
             # seems to be due to limit on number of ids in single request
-            # switiching to a for loop for each data source
-            # appending all results into single res
-            res = []
-            for ds_id in self.otherIds:
-                tmp = self._resolve(terms, [ds_id])
-                res.append(tmp[0])
-            self._write(res)
-            alt_terms = self._parseNames(res)
+            # switiching to a query for each data source
+            # archiving all results into single file
+            archive = self._archive()
+            alt_terms, sources = self._searchOthers(terms, archive)
+            archive.close()
             if len(alt_terms) == 0:
+                if self.stats is not None:
+                    self.stats.save()
                 return False
             else:
                 # search the main source again with alt_terms
                 # replace names in json
                 terms = [each[1] for each in alt_terms]  # unzip
-                res = self._resolve(terms, self.Id)
-                self._write(res)
-                alt_res = self._replaceSupStrNames(res, alt_terms)
-                return alt_res
+                archive = self._archive()
+
+                def replace(records):
+                    archive.write(records)
+                    self._credit(records, sources)
+                    sink(self._replaceSupStrNames(records, alt_terms))
+                self._resolve(terms, self.Id, replace)
+                archive.close()
+                if self.stats is not None:
+                    self.stats.save()
+                return res
+
+    def _searchOthers(self, terms, archive):
+        # query other data sources, a wave of ds_concurrency at a time; if
+        #  early_stop, stop once every term has an alternative name
+        # archive records, return alternative names and the data sources of
+        #  each alternative name
+        ds_ids = self._orderOthers()
+        size = self.ds_concurrency
+        workers = None
+        if size > 1 and len(ds_ids) > 1:
+            workers = ThreadPool(min(size, len(ds_ids)))
+
+        def resolve(ds_id):
+            found = []
+
+            def parse(records):
+                archive.write(records)
+                found.extend(self._parseNames(records))
+            self._resolve(terms, [ds_id], parse)
+            return found
+
+        alt_terms = set()
+        sources = {}
+        remaining = set(terms)
+        try:
+            for i in range(0, len(ds_ids), size):
+                wave = ds_ids[i:i + size]
+                if workers is not None and len(wave) > 1:
+                    founds = workers.map(resolve, wave)
+                else:
+                    founds = [resolve(ds_id) for ds_id in wave]
+                for ds_id, found in zip(wave, founds):
+                    self._tally(ds_id, found, sources)
+                    alt_terms.update(found)
+                    remaining -= set([each[0] for each in found])
+                if self.early_stop and not remaining and \
+                        i + size < len(ds_ids):
+                    self.logger.info('All terms have alternative names, '
+                                     'skipping [{0}] data sources'.format(
+                                         len(ds_ids) - i - size))
+                    break
+        finally:
+            if workers is not None:
+                workers.close()
+                workers.join()
+        return list(alt_terms), sources
+
+    def _orderOthers(self):
+        # other data sources by past yield, up to max_sources
+        ds_ids = list(self.otherIds)
+        if self.stats is not None:
+            ds_ids = self.stats.order(ds_ids)
+        if self.max_sources is not None:
+            ds_ids = ds_ids[:self.max_sources]
+        return ds_ids
+
+    def _tally(self, ds_id, alt_terms, sources):
+        # add ds_id to the sources of each alternative name it gave and
+        #  record its yield
+        for each in alt_terms:
+            sources.setdefault(each[1], set()).add(ds_id)
+        if self.stats is not None:
+            self.stats.record(ds_id, queried=1, alt_names=len(alt_terms))
+
+    def _credit(self, records, sources):
+        # record a resolved name for the sources of each alternative name
+        #  resolved in the main data source
+        if self.stats is None:
+            return
+        for record in records:
+            if len(record.get('results', [])) > 0:
+                for ds_id in sources.get(record['supplied_name_string'], []):
+                    self.stats.record(ds_id, resolved=1)
 
     def _parseNames(self, jobj):
         # return a list of tuples (term, name) from second search
@@ -127,75 +421,347 @@ Return JSON object."""
             record['supplied_name_string'] = term
         return jobj
 
-    def _resolve(self, terms, ds_id):
-        # Query server in chunks
-        chunk_size = 100
-        res = []
-        lower = 0
-        while lower < len(terms):
-            upper = min(len(terms), lower + chunk_size)
+    def _resolve(self, terms, ds_id, sink=None):
+        # Take results from the cache if any, query server for the rest. If
+        #  sink, pass records to it a chunk at a time, else return records in
+        #  the order of terms
+        if self.cache is None:
+            return self._resolveChunks(terms, ds_id, sink)
+        if sink is not None:
+            misses = self._sinkCached(terms, ds_id, sink)
+            if misses:
+                self._resolveChunks(misses, ds_id, sink)
+            return
+        cached = self.cache.get(terms, ds_id)
+        misses = [term for term in terms if term not in cached]
+        self.logger.info('Found [{0}] of [{1}] names in cache'.format(
+            len(terms) - len(misses), len(terms)))
+        fetched = self._resolveChunks(misses, ds_id) if misses else []
+        return self._merge(terms, cached, fetched)
+
+    def _sinkCached(self, terms, ds_id, sink):
+        # pass records of terms found in the cache to sink a chunk at a time,
+        #  so no more than a chunk is held at once, return the other terms
+        misses = []
+        for lower in range(0, len(terms), self.sizer.size):
+            chunk = terms[lower:lower + self.sizer.size]
+            cached = self.cache.get(chunk, ds_id)
+            # a record for each time a term is given, alternative names of
+            #  synonyms repeat and their records are renamed in place
+            records = [dict(cached[term]) for term in chunk if term in cached]
+            if records:
+                sink(records)
+            misses.extend([term for term in chunk if term not in cached])
+        self.logger.info('Found [{0}] of [{1}] names in cache'.format(
+            len(terms) - len(misses), len(terms)))
+        return misses
+
+    def _merge(self, terms, cached, fetched):
+        # return cached and fetched records in the order of terms, GNR
+        #  returns a record for each name sent in the order sent
+        if len(cached) == 0:
+            return fetched
+        hits = [dict(cached[term]) for term in terms if term in cached]
+        if len(fetched) != len(terms) - len(hits):
+            return hits + fetched
+        hits = iter(hits)
+        fetched = iter(fetched)
+        return [next(hits) if term in cached else next(fetched) for term in
+                terms]
+
+    def _resolveChunks(self, terms, ds_id, sink=None):
+        # Query server in chunks, up to concurrency at a time, cutting the
+        #  next chunk at the latest chunk size as soon as a query returns.
+        #  Records of each chunk are passed to sink, in order, and dropped;
+        #  without a sink all records are returned
+        def query(chunk):
+            lower, upper = chunk
             self.logger.info('Querying [{0}] to [{1}] of [{2}]'.
                              format(lower, upper, len(terms)))
-            query = self._query(terms[lower:upper], ds_id)
-            res.append(query)
-            lower = upper
-        res = [record for search in res for record in search['data']]
+            start = time.time()
+            limited = self._limitedFor()
+            search = self._query(terms[lower:upper], ds_id)
+            # time spent held by the rate limiter is not latency
+            latency = time.time() - start - (self._limitedFor() - limited)
+            self.sizer.record(upper - lower, latency, search is not None)
+            if search is None:
+                raise GnrQueryError('No results for [{0}] to [{1}] of [{2}] '
+                                    'names, GNR server may be down'.format(
+                                        lower, upper, len(terms)))
+            if self.cache is not None:
+                self.cache.put(search['data'], ds_id)
+            return search
+
+        res = []
+        if sink is None:
+            sink = res.extend
+        if self.concurrency == 1 or len(terms) <= self.sizer.size:
+            lower = 0
+            while lower < len(terms):
+                upper = min(len(terms), lower + self.sizer.size)
+                sink(query((lower, upper))['data'])
+                lower = upper
+            return(res)
+
+        returned = queue.Queue()
+
+        def run(index, chunk):
+            # each chunk is retried independently by safeReadJSON
+            try:
+                return query(chunk)
+            finally:
+                returned.put(index)
+
+        workers = ThreadPool(self.concurrency)
+        pending = {}  # index of chunk: result of its query
+        searches = {}  # index of chunk: search waiting for earlier chunks
+        # chunks held waiting on a slow earlier chunk are capped, so no more
+        #  than window chunks of records are held at once
+        window = 2 * self.concurrency
+        lower = 0
+        nchunks = 0
+        nsunk = 0
+        try:
+            while lower < len(terms) or pending:
+                while lower < len(terms) and \
+                        len(pending) < self.concurrency and \
+                        len(pending) + len(searches) < window:
+                    upper = min(len(terms), lower + self.sizer.size)
+                    pending[nchunks] = workers.apply_async(
+                        run, (nchunks, (lower, upper)))
+                    nchunks += 1
+                    lower = upper
+                index = returned.get()
+                searches[index] = pending.pop(index).get()
+                while nsunk in searches:
+                    sink(searches.pop(nsunk)['data'])
+                    nsunk += 1
+        finally:
+            workers.close()
+            workers.join()
         return(res)
 
     def _query(self, terms, data_source_ids):
         ds_ids = [str(id) for id in data_source_ids]
         terms = [urllib.parse.quote(six.text_type(t).encode('utf8')) for t in terms]
-        url = ('http://resolver.globalnames.org/name_resolvers.json?' +
-               'data_source_ids=' + '|'.join(ds_ids) + '&' +
-               'resolve_once=false&' + 'names=' + '|'.join(terms))
-        return safeReadJSON(url, self.logger)
+        url = self.server + '/name_resolvers.json'
+        params = ('data_source_ids=' + '|'.join(ds_ids) + '&' +
+                  'resolve_once=false&' + 'names=' + '|'.join(terms))
+        if self.post:
+            return safeReadJSON(url, self.logger, pool=self.pool, data=params,
+                                policy=self.policy, limiter=self.limiter,
+                                nnames=len(terms))
+        return safeReadJSON(url + '?' + params, self.logger, pool=self.pool,
+                            policy=self.policy, limiter=self.limiter,
+                            nnames=len(terms))
 
-    def _write(self, jobj):
-        directory = os.path.join(os.getcwd(), 'resolved_names')
-        filename = "{0}_raw_results.json".format(self.write_counter)
-        jobj_file = os.path.join(directory, filename)
-        with open(jobj_file, 'w') as outfile:
-            json.dump(jobj, outfile)
+    def _limitedFor(self):
+        # seconds this thread has been held by the rate limiter
+        if self.limiter is None:
+            return 0.
+        return self.limiter.threadWaited()
+
+    def report(self):
+        """Log statistics of the run"""
+        self.logger.info(self.policy.report())
+        if self.limiter is not None:
+            self.logger.info(self.limiter.report())
+        if self.cache is not None:
+            self.logger.info(self.cache.report())
+
+    def flush(self):
+        """Wait for raw results to be archived"""
+        self.writer.flush()
+
+    def _archive(self):
+        # return writer of raw results of the next search
+        nsearch = self.write_counter
         self.write_counter += 1
+        if self.archive is None:
+            return NullArchive()
+        if callable(self.archive):
+            return SinkArchive(self.archive, nsearch, self.writer)
+        directory = self.archive_dir
+        if directory is None:
+            directory = os.path.join(os.getcwd(), 'resolved_names')
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        if self.archive == 'ndjson':
+            filename = "{0}_raw_results.ndjson.gz".format(nsearch)
+            return NDJSONArchive(os.path.join(directory, filename),
+                                 self.writer,
+                                 append=nsearch in self.appending)
+        filename = "{0}_raw_results.json".format(nsearch)
+        return RawArchive(os.path.join(directory, filename), self.writer)
+
+    def _write(self, jobj):
+        archive = self._archive()
+        archive.write(jobj)
+        archive.close()
+
+
+class TaxonFilter(object):
+    """Taxon filter class: keep results in any of the clades of include \
+(all if None) and in none of the clades of exclude, by the IDs of their \
+classification paths. Whether to keep each path is worked out once and \
+cached, up to maxsize paths."""
+
+    def __init__(self, include=None, exclude=None, maxsize=100000):
+        self.include = None
+        if include:
+            self.include = frozenset([str(e) for e in include])
+        self.exclude = frozenset([str(e) for e in exclude or []])
+        self.maxsize = maxsize
+        self._keep = {}  # classification_path_ids: whether to keep
+
+    def __bool__(self):
+        return self.include is not None or len(self.exclude) > 0
+    __nonzero__ = __bool__
+
+    def keep(self, path):
+        """Return whether to keep results with classification_path_ids path"""
+        keep = self._keep.get(path)
+        if keep is None:
+            ids = frozenset(path.split('|'))
+            keep = (self.include is None or not self.include.isdisjoint(ids)) \
+                and self.exclude.isdisjoint(ids)
+            if len(self._keep) >= self.maxsize:
+                self._keep.clear()
+            self._keep[path] = keep
+        return keep
+
+    def filter(self, results):
+        """Return results to keep"""
+        keep = self.keep
+        return [result for result in results if
+                keep(result['classification_path_ids'])]
+
+    def filterRecords(self, records):
+        """Return (term, results to keep) of each record with results in a \
+chunk of records"""
+        if not self:
+            return [(record['supplied_name_string'], record['results']) for
+                    record in records if 'results' in record]
+        return [(record['supplied_name_string'],
+                 self.filter(record['results'])) for record in records if
+                'results' in record]
 
 
 class GnrStore(dict):
     """GNR store class: acts like a dictionary for GNR JSON format"""
 
-    def __init__(self, terms, logger, tax_group=None):
+    def __init__(self, terms, logger, tax_group=None, exclude=None):
+        """Store results of terms, kept live in sets of terms with none \
+(unresolved), one (resolved) and multiple (multiple) results:
+- tax_group: ID or list of IDs of clades results must be in one of
+- exclude: ID or list of IDs of clades results must be in none of"""
         self.logger = logger
-        # Issue 6: suggest multiple tax_groups, not just one
-        if not tax_group:
-            self.tax_group = tax_group
-        else:
-            if not isinstance(tax_group, list):
-                tax_group = [tax_group]
-            # ensure strings
-            self.tax_group = [str(e) for e in tax_group]
+        self.unresolved = set()
+        self.resolved = set()
+        self.multiple = set()
+        self._tax_group = None
+        self._exclude = None
+        self.exclude = exclude
+        self.tax_group = tax_group
         for term in terms:
             self[term] = []
 
+    @staticmethod
+    def _ids(ids):
+        # Issue 6: suggest multiple tax_groups, not just one
+        if not ids:
+            return ids
+        if not isinstance(ids, list):
+            ids = [ids]
+        # ensure strings
+        return [str(e) for e in ids]
+
+    @property
+    def tax_group(self):
+        return self._tax_group
+
+    @tax_group.setter
+    def tax_group(self, tax_group):
+        self._tax_group = self._ids(tax_group)
+        self._taxfilter = TaxonFilter(self._tax_group, self._exclude)
+
+    @property
+    def exclude(self):
+        return self._exclude
+
+    @exclude.setter
+    def exclude(self, exclude):
+        self._exclude = self._ids(exclude)
+        self._taxfilter = TaxonFilter(self._tax_group, self._exclude)
+
+    def _index(self, term, nrecords):
+        # move term to the set of its number of records
+        self.unresolved.discard(term)
+        self.resolved.discard(term)
+        self.multiple.discard(term)
+        if nrecords == 0:
+            self.unresolved.add(term)
+        elif nrecords == 1:
+            self.resolved.add(term)
+        else:
+            self.multiple.add(term)
+
+    def __setitem__(self, term, results):
+        dict.__setitem__(self, term, results)
+        self._index(term, len(results))
+
+    def __delitem__(self, term):
+        dict.__delitem__(self, term)
+        self.unresolved.discard(term)
+        self.resolved.discard(term)
+        self.multiple.discard(term)
+
+    def update(self, other):
+        for term, results in other.items():
+            self[term] = results
+
+    def pop(self, term, *default):
+        if term not in self:
+            if default:
+                return default[0]
+            raise KeyError(term)
+        results = self[term]
+        del self[term]
+        return results
+
+    def popitem(self):
+        if len(self) == 0:
+            raise KeyError('popitem(): store is empty')
+        term = next(iter(self))
+        return term, self.pop(term)
+
+    def setdefault(self, term, default=None):
+        if term not in self:
+            self[term] = [] if default is None else default
+        return self[term]
+
+    def clear(self):
+        dict.clear(self)
+        self.unresolved.clear()
+        self.resolved.clear()
+        self.multiple.clear()
+
     def _filter(self, results):
-        # filter out all results that are not in tax_group
-        if not self.tax_group:
+        # filter out all results that are not in tax_group, or are excluded
+        if not self._taxfilter:
             return results
-        filtered = []
-        for result in results:
-            classids = result['classification_path_ids'].split('|')
-            if any([True if e in classids else False for e in self.tax_group]):
-                filtered.append(result)
-        return filtered
+        return self._taxfilter.filter(results)
 
     def add(self, jobj):
         if not isinstance(jobj, bool):
-            for record in jobj:
-                term = record['supplied_name_string']
+            for term, results in self._taxfilter.filterRecords(jobj):
                 try:
-                    if 'results' in list(record.keys()):
-                        results = self._filter(record['results'])
-                        self[term].extend(results)
+                    records = dict.__getitem__(self, term)
                 except KeyError:
                     self.logger.debug('JSON object contains terms not in self.logger')
+                    continue
+                records.extend(results)
+                self._index(term, len(records))
 
     def replace(self, jobj):
         for record in jobj:
@@ -208,3 +774,200 @@ class GnrStore(dict):
                     self[term] = []
             except KeyError:
                 self.logger.debug('JSON object contains terms not in GnrStore')
+
+    def columns(self, fields):
+        """Return list of the terms with results and list of a column for \
+each of fields, of its value in the first result of each term, in one pass \
+without copying results"""
+        terms = []
+        columns = [[] for _ in fields]
+        for term, results in dict.items(self):
+            if len(results) == 0:
+                continue
+            terms.append(term)
+            result = results[0]
+            for field, column in zip(fields, columns):
+                column.append(result[field])
+        return terms, columns
+
+    def footprint(self):
+        """Return approximate bytes of memory held by the store"""
+        size = sys.getsizeof(self)
+        for term, results in dict.items(self):
+            size += sys.getsizeof(term) + sys.getsizeof(results)
+            for result in results:
+                size += sys.getsizeof(result)
+                for key, value in result.items():
+                    size += sys.getsizeof(key) + sys.getsizeof(value)
+        return size
+
+    def report(self):
+        return 'Store of [{0}] names holds [{1:.1f}] MB'.format(
+            len(self), self.footprint() / 1048576.)
+
+
+class CompactGnrStore(GnrStore):
+    """Compact GNR store class: acts like a GnrStore, but keeps only the \
+fields of each result needed by Resolver, in columns of integer arrays \
+indexing a table of interned values. Results are returned as new dicts, so \
+changing them does not change the store."""
+
+    fields = ('classification_path', 'data_source_title', 'match_type',
+              'score', 'classification_path_ranks', 'name_string',
+              'canonical_form', 'classification_path_ids', 'prescore',
+              'data_source_id', 'taxon_id', 'gni_uuid')
+
+    def __init__(self, terms, logger, tax_group=None, exclude=None):
+        self._values = []  # interned values, indexed by the columns
+        self._interned = {}  # (type, value): index in _values
+        self._columns = [array('i') for _ in self.fields]
+        self._live = 0  # rows held by terms
+        self._dead = 0  # rows no longer held by any term
+        super(CompactGnrStore, self).__init__(terms, logger,
+                                              tax_group=tax_group,
+                                              exclude=exclude)
+
+    def _intern(self, value):
+        # return index of value in table, adding it if new; the type is part
+        #  of the key so 1, 1.0 and True stay distinct
+        key = (type(value), value)
+        i = self._interned.get(key)
+        if i is None:
+            i = len(self._values)
+            self._values.append(value)
+            self._interned[key] = i
+        return i
+
+    def _rows(self, results):
+        # append results as rows, -1 marks a missing field, return row IDs
+        rows = array('i')
+        self._live += len(results)
+        for result in results:
+            rows.append(len(self._columns[0]))
+            for field, column in zip(self.fields, self._columns):
+                if field in result:
+                    column.append(self._intern(result[field]))
+                else:
+                    column.append(-1)
+        return rows
+
+    def _results(self, rows):
+        values = self._values
+        return [dict([(field, values[column[row]]) for field, column in
+                      zip(self.fields, self._columns) if column[row] >= 0])
+                for row in rows]
+
+    def _compact(self):
+        # drop rows no longer held once they outnumber those that are
+        if self._dead < 10000 or self._dead < self._live:
+            return
+        columns = [array('i') for _ in self.fields]
+        for term, rows in dict.items(self):
+            new_rows = array('i')
+            for row in rows:
+                new_rows.append(len(columns[0]))
+                for column, old_column in zip(columns, self._columns):
+                    column.append(old_column[row])
+            dict.__setitem__(self, term, new_rows)
+        self._columns = columns
+        self._dead = 0
+
+    def __getitem__(self, term):
+        return self._results(dict.__getitem__(self, term))
+
+    def __setitem__(self, term, results):
+        if term in self:
+            dead = len(dict.__getitem__(self, term))
+            self._dead += dead
+            self._live -= dead
+        dict.__setitem__(self, term, self._rows(results))
+        self._index(term, len(results))
+        self._compact()
+
+    def __delitem__(self, term):
+        dead = len(dict.__getitem__(self, term))
+        self._dead += dead
+        self._live -= dead
+        super(CompactGnrStore, self).__delitem__(term)
+        self._compact()
+
+    def __iter__(self):
+        # overriding __iter__ stops dict() copying the rows of each term
+        #  rather than its results
+        return dict.__iter__(self)
+
+    def __repr__(self):
+        return '{0}({1!r})'.format(type(self).__name__, dict(self.items()))
+
+    def clear(self):
+        super(CompactGnrStore, self).clear()
+        self._values = []
+        self._interned = {}
+        self._columns = [array('i') for _ in self.fields]
+        self._live = 0
+        self._dead = 0
+
+    def __eq__(self, other):
+        if isinstance(other, dict):
+            other = dict(other.items())
+        return dict(self.items()) == other
+
+    def __ne__(self, other):
+        return not self == other
+
+    def get(self, term, default=None):
+        if term in self:
+            return self[term]
+        return default
+
+    def items(self):
+        return [(term, self[term]) for term in self.keys()]
+
+    def values(self):
+        return [self[term] for term in self.keys()]
+
+    def copy(self):
+        return dict(self.items())
+
+    def add(self, jobj):
+        if not isinstance(jobj, bool):
+            for term, results in self._taxfilter.filterRecords(jobj):
+                if term not in self:
+                    self.logger.debug('JSON object contains terms not in '
+                                      'GnrStore')
+                    continue
+                rows = dict.__getitem__(self, term)
+                rows.extend(self._rows(results))
+                self._index(term, len(rows))
+
+    def columns(self, fields):
+        # read the first row of each term straight from the value table
+        values = self._values
+        field_columns = [self._columns[self.fields.index(field)] for field in
+                         fields]
+        terms = []
+        columns = [[] for _ in fields]
+        for term, rows in dict.items(self):
+            if len(rows) == 0:
+                continue
+            terms.append(term)
+            row = rows[0]
+            for field, field_column, column in zip(fields, field_columns,
+                                                   columns):
+                i = field_column[row]
+                if i < 0:
+                    raise KeyError(field)
+                column.append(values[i])
+        return terms, columns
+
+    def footprint(self):
+        """Return approximate bytes of memory held by the store"""
+        size = sys.getsizeof(self) + sys.getsizeof(self._values) + \
+            sys.getsizeof(self._interned)
+        size += sum([sys.getsizeof(column) for column in self._columns])
+        size += sum([sys.getsizeof(term) + sys.getsizeof(rows) for term, rows
+                     in dict.items(self)])
+        # keys of the index are tuples holding the values
+        size += sum([sys.getsizeof(value) for value in self._values])
+        size += sum([sys.getsizeof(key) for key in self._interned])
+        return size
@@ -0,0 +1,319 @@
+#! /usr/bin/env python
+"""
+Tools for talking HTTP to the GNR.
+"""
+from __future__ import absolute_import
+
+import json
+import random
+import socket
+import threading
+import time
+import zlib
+from six.moves import http_client, urllib
+try:
+    import fcntl
+except ImportError:
+    # not POSIX, rate limiters cannot be shared between processes
+    fcntl = None
+
+
+# CLASSES
+class GnrHTTPError(IOError):
+    """Raised for an HTTP error status returned by the server"""
+
+    def __init__(self, url, status, reason=''):
+        self.url = url
+        self.status = status
+        msg = 'HTTP Error {0}: {1}'.format(status, reason)
+        super(GnrHTTPError, self).__init__(msg)
+
+
+class GnrQueryError(IOError):
+    """Raised when a query gives up, the GNR server may be down"""
+    pass
+
+
+class ConnectionPool(object):
+    """Connection pool class: keep connections to each host alive between \
+requests and ask for gzipped responses. May be shared between threads and \
+between resolvers."""
+
+    def __init__(self, maxsize=10, timeout=60):
+        self.maxsize = maxsize  # idle connections kept per host
+        self.timeout = timeout  # seconds before a socket gives up
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _get(self, key):
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                return idle.pop()
+        scheme, host = key
+        if scheme == 'https':
+            return http_client.HTTPSConnection(host, timeout=self.timeout)
+        return http_client.HTTPConnection(host, timeout=self.timeout)
+
+    def _put(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, url, data=None, max_redirects=5):
+        """Return body of response to URL as bytes: GET, or POST if data \
+(url-encoded string) is given"""
+        parts = urllib.parse.urlsplit(url)
+        key = (parts.scheme, parts.netloc)
+        path = parts.path or '/'
+        if parts.query:
+            path += '?' + parts.query
+        headers = {'Accept': 'application/json', 'Accept-Encoding': 'gzip'}
+        if data is None:
+            method = 'GET'
+            payload = None
+        else:
+            method = 'POST'
+            payload = data.encode('utf8')
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        while True:
+            conn = self._get(key)
+            # the server may have closed an idle connection, retry once new
+            reused = conn.sock is not None
+            try:
+                conn.request(method, path, body=payload, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+            except (http_client.HTTPException, socket.error):
+                conn.close()
+                if reused:
+                    continue
+                raise
+            break
+        if response.will_close:
+            conn.close()
+        else:
+            self._put(key, conn)
+        location = response.getheader('Location')
+        if response.status in (301, 302, 303, 307, 308) and location and \
+                max_redirects > 0:
+            if response.status == 303:
+                data = None
+            return self.request(urllib.parse.urljoin(url, location), data,
+                                max_redirects - 1)
+        if response.status >= 400:
+            raise GnrHTTPError(url, response.status, response.reason)
+        if response.getheader('Content-Encoding', '').lower() == 'gzip':
+            body = zlib.decompress(body, 16 + zlib.MAX_WBITS)
+        return body
+
+    def close(self):
+        """Close all idle connections"""
+        with self._lock:
+            idle = [conn for conns in self._idle.values() for conn in conns]
+            self._idle = {}
+        for conn in idle:
+            conn.close()
+
+
+class CircuitBreaker(object):
+    """Circuit breaker class: after threshold failures in a row, hold back \
+all queries while the server is down, letting a single query through every \
+probe seconds to test whether it has recovered. Held queries give up once the \
+server has been down for patience seconds."""
+
+    def __init__(self, logger, threshold=5, probe=30, patience=3600):
+        self.logger = logger
+        self.threshold = threshold
+        self.probe = probe
+        self.patience = patience  # an hour by default
+        self.failures = 0
+        self.opened = None  # time circuit last opened, None if closed
+        self.down = None  # time circuit first opened
+        self.probing = False
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """Block until a query may be sent, raise GnrQueryError if the \
+server has been down too long"""
+        with self._cond:
+            while self.opened is not None:
+                if time.time() - self.down > self.patience:
+                    raise GnrQueryError('GNR server down for more than [{0}] '
+                                        'seconds'.format(self.patience))
+                remaining = self.opened + self.probe - time.time()
+                if not self.probing and remaining <= 0:
+                    # this caller is the probe
+                    self.probing = True
+                    break
+                self._cond.wait(remaining if remaining > 0 else self.probe)
+
+    def success(self):
+        with self._cond:
+            if self.opened is not None:
+                self.logger.info('----- GNR server has recovered -----')
+            self.failures = 0
+            self.opened = None
+            self.down = None
+            self.probing = False
+            self._cond.notify_all()
+
+    def failure(self):
+        """Count a failure, return True if queries are now held"""
+        with self._cond:
+            self.failures += 1
+            if self.probing or (self.opened is None and
+                                self.failures >= self.threshold):
+                if not self.probing:
+                    self.logger.info('----- GNR server may be down : holding '
+                                     'queries ----')
+                    self.down = time.time()
+                self.opened = time.time()
+                self.probing = False
+            self._cond.notify_all()
+            return self.opened is not None
+
+
+class RetryPolicy(object):
+    """Retry policy class: wait between tries with exponential backoff from \
+base seconds, capped at cap seconds, with full jitter. Give up on a query \
+after max_tries, or on all queries once budget retries have been spent. \
+Queries are held back by a CircuitBreaker if given. Counts retries and \
+seconds spent waiting."""
+
+    def __init__(self, max_tries=6, base=2, cap=600, jitter=True, budget=None,
+                 breaker=None):
+        self.max_tries = max_tries
+        self.base = base
+        self.cap = cap
+        self.jitter = jitter
+        self.budget = budget
+        self.breaker = breaker
+        self.retries = 0
+        self.waited = 0.
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a query may be sent"""
+        if self.breaker is not None:
+            start = time.time()
+            self.breaker.acquire()
+            self.record(time.time() - start)
+
+    def success(self):
+        if self.breaker is not None:
+            self.breaker.success()
+
+    def failure(self, error=None):
+        """Count a failed query, return True if the CircuitBreaker now \
+holds queries. Errors of the query itself (HTTP 4xx) are not counted."""
+        if self.breaker is None:
+            return False
+        if isinstance(error, GnrHTTPError) and 400 <= error.status < 500 \
+                and error.status not in (408, 429):
+            return False
+        return self.breaker.failure()
+
+    def retry(self, attempt):
+        """Return seconds to wait after failed attempt (counting from 0), or \
+None to give up"""
+        if attempt + 1 >= self.max_tries:
+            return None
+        with self._lock:
+            if self.budget is not None and self.retries >= self.budget:
+                return None
+            self.retries += 1
+        delay = min(self.cap, self.base * 2 ** attempt)
+        if self.jitter:
+            delay = random.uniform(0, delay)
+        return delay
+
+    def wait(self, delay):
+        time.sleep(delay)
+        self.record(delay)
+
+    def record(self, waited):
+        """Count seconds spent waiting"""
+        with self._lock:
+            self.waited += waited
+
+    def report(self):
+        return 'Retried [{0}] queries, waiting [{1:.1f}] seconds'.format(
+            self.retries, self.waited)
+
+
+class RateLimiter(object):
+    """Rate limiter class: token buckets holding queries to requests_per_sec \
+and names_per_sec, allowing bursts of up to burst seconds' worth. Each query \
+reserves its tokens in turn and waits until they are paid for, so a limiter \
+may be shared between threads and resolvers. If lockfile is given the buckets \
+are kept in it, shared by every process on the host using it (POSIX only)."""
+
+    def __init__(self, requests_per_sec=None, names_per_sec=None, burst=1.,
+                 lockfile=None):
+        if lockfile is not None and fcntl is None:
+            raise IOError('Lock files are not supported on this platform')
+        self.rates = {'requests': requests_per_sec, 'names': names_per_sec}
+        self.burst = burst
+        self.lockfile = lockfile
+        self.waited = 0.
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def _take(self, buckets, costs, now):
+        # refill buckets, take costs, return seconds until they are paid for
+        wait = 0.
+        for key, rate in self.rates.items():
+            if not rate:
+                continue
+            capacity = rate * self.burst
+            tokens, last = buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + rate * max(0., now - last))
+            tokens -= costs[key]
+            buckets[key] = (tokens, now)
+            wait = max(wait, -tokens / rate)
+        return wait
+
+    def reserve(self, nnames=0):
+        """Reserve tokens for a query of nnames, return seconds to wait \
+before sending it"""
+        costs = {'requests': 1, 'names': nnames}
+        with self._lock:
+            if self.lockfile is None:
+                wait = self._take(self._buckets, costs, time.time())
+            else:
+                with open(self.lockfile, 'a+') as lockfile:
+                    fcntl.flock(lockfile, fcntl.LOCK_EX)
+                    try:
+                        lockfile.seek(0)
+                        try:
+                            buckets = json.loads(lockfile.read())
+                        except ValueError:
+                            buckets = {}
+                        wait = self._take(buckets, costs, time.time())
+                        lockfile.seek(0)
+                        lockfile.truncate()
+                        lockfile.write(json.dumps(buckets))
+                        lockfile.flush()
+                    finally:
+                        fcntl.flock(lockfile, fcntl.LOCK_UN)
+            self.waited += wait
+        return wait
+
+    def acquire(self, nnames=0):
+        """Block until a query of nnames may be sent"""
+        wait = self.reserve(nnames)
+        if wait > 0:
+            time.sleep(wait)
+        self._local.waited = self.threadWaited() + wait
+
+    def threadWaited(self):
+        """Return seconds the calling thread has waited in acquire"""
+        return getattr(self._local, 'waited', 0.)
+
+    def report(self):
+        return 'Rate limited queries for [{0:.1f}] seconds'.format(self.waited)
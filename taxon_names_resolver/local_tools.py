@@ -0,0 +1,185 @@
+#! /usr/bin/env python
+"""
+Tools for resolving names offline against a local NCBI taxonomy dump.
+"""
+from __future__ import absolute_import
+
+import io
+import os
+import re
+import sqlite3
+import threading
+from .gnr_tools import GnrResolver
+
+
+# FUNCTIONS
+def canonical(name):
+    '''Return canonical form of name: the genus and lower case epithets, \
+without rank markers, authorities or years'''
+    words = name.split()
+    if not words:
+        return ''
+    res = [words[0]]
+    for word in words[1:]:
+        if re.match(r'^[a-z]+\.$', word):
+            # rank marker, e.g. subsp.
+            continue
+        if not re.match(r'^[a-z][a-z-]*$', word):
+            break
+        res.append(word)
+    return ' '.join(res)
+
+
+def readDmp(path):
+    '''Yield fields of each line of an NCBI .dmp file'''
+    with io.open(path, 'r', encoding='utf8') as infile:
+        for line in infile:
+            line = line.rstrip('\n')
+            if line.endswith('\t|'):
+                line = line[:-2]
+            yield line.split('\t|\t')
+
+
+def buildIndex(names_file, nodes_file, path, batch=100000):
+    '''Build SQLite index at path from NCBI names.dmp and nodes.dmp files'''
+    if os.path.isfile(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute('CREATE TABLE nodes (taxon_id INTEGER PRIMARY KEY, '
+                     'parent INTEGER, rank TEXT, name TEXT)')
+        conn.execute('CREATE TABLE names (name TEXT, canonical TEXT, '
+                     'taxon_id INTEGER, name_class TEXT)')
+        rows = []
+        for fields in readDmp(nodes_file):
+            rows.append((int(fields[0]), int(fields[1]), fields[2]))
+            if len(rows) >= batch:
+                conn.executemany('INSERT INTO nodes (taxon_id, parent, rank) '
+                                 'VALUES (?, ?, ?)', rows)
+                rows = []
+        conn.executemany('INSERT INTO nodes (taxon_id, parent, rank) VALUES '
+                         '(?, ?, ?)', rows)
+        rows = []
+        scientific = []
+        for fields in readDmp(names_file):
+            taxon_id, name, name_class = int(fields[0]), fields[1], fields[3]
+            rows.append((name, canonical(name), taxon_id, name_class))
+            if name_class == 'scientific name':
+                scientific.append((name, taxon_id))
+            if len(rows) >= batch:
+                conn.executemany('INSERT INTO names VALUES (?, ?, ?, ?)', rows)
+                rows = []
+        conn.executemany('INSERT INTO names VALUES (?, ?, ?, ?)', rows)
+        conn.executemany('UPDATE nodes SET name = ? WHERE taxon_id = ?',
+                         scientific)
+        conn.execute('CREATE INDEX name_idx ON names (name)')
+        conn.execute('CREATE INDEX canonical_idx ON names (canonical)')
+    conn.close()
+
+
+# CLASSES
+class LocalIndex(object):
+    """Local index class: look up names in an index built by buildIndex, \
+returning GNR style results. Exact matches of a name score above matches of \
+its canonical form."""
+
+    def __init__(self, path, data_source_id=4, data_source_title='NCBI'):
+        self.path = path
+        self.data_source_id = data_source_id
+        self.data_source_title = data_source_title
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self._paths = {}  # taxon ID: (path, ranks, ids) of its lineage
+
+    def _lineage(self, taxon_id):
+        # return (names, ranks, ids) of lineage from top to taxon, without
+        #  the root, walking up until a known lineage is met
+        walked = []
+        while taxon_id not in self._paths:
+            row = self._conn.execute('SELECT parent, rank, name FROM nodes '
+                                     'WHERE taxon_id = ?',
+                                     (taxon_id,)).fetchone()
+            if row is None or row[0] == taxon_id:
+                # root, or unknown
+                self._paths[taxon_id] = ((), (), ())
+                break
+            walked.append((taxon_id, row))
+            taxon_id = row[0]
+        lineage = self._paths[taxon_id]
+        for taxon_id, (parent, rank, name) in reversed(walked):
+            rank = '' if rank == 'no rank' else rank
+            lineage = (lineage[0] + (name,), lineage[1] + (rank,),
+                       lineage[2] + (str(taxon_id),))
+            self._paths[taxon_id] = lineage
+        return lineage
+
+    def _result(self, name, taxon_id, exact):
+        names, ranks, ids = self._lineage(taxon_id)
+        return {'classification_path': '|' + '|'.join(names),
+                'classification_path_ranks': '|' + '|'.join(ranks),
+                'classification_path_ids': '|' + '|'.join(ids),
+                'data_source_title': self.data_source_title,
+                'data_source_id': self.data_source_id,
+                'match_type': 1 if exact else 2,
+                'score': 0.988 if exact else 0.75,
+                'prescore': '3|0|0' if exact else '2|0|0',
+                'name_string': name,
+                'canonical_form': canonical(name),
+                'taxon_id': str(taxon_id),
+                'gni_uuid': None}
+
+    def lookup(self, terms):
+        """Return GNR style records of terms"""
+        records = []
+        with self._lock:
+            for term in terms:
+                results = []
+                seen = set()
+                rows = self._conn.execute(
+                    'SELECT name, taxon_id, 1 FROM names WHERE name = ? UNION '
+                    'ALL SELECT name, taxon_id, 0 FROM names WHERE canonical '
+                    '= ?', (term, canonical(term)))
+                for name, taxon_id, exact in rows:
+                    if taxon_id in seen:
+                        continue
+                    seen.add(taxon_id)
+                    results.append(self._result(name, taxon_id, exact))
+                record = {'supplied_name_string': term}
+                if len(results) > 0:
+                    record['results'] = results
+                records.append(record)
+        return records
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class LocalGnrResolver(GnrResolver):
+    """Local GNR resolver class: resolve names against a local NCBI taxonomy \
+instead of the GNR. taxonomy is either an index built by buildIndex or a \
+directory of names.dmp and nodes.dmp, indexed there on first use. There are \
+no other data sources to search for alternative names."""
+
+    def __init__(self, logger, taxonomy, datasource='NCBI', data_source_id=4,
+                 **kwargs):
+        kwargs.setdefault('post', True)  # no URL to limit chunk size
+        super(LocalGnrResolver, self).__init__(logger, datasource=datasource,
+                                               **kwargs)
+        if os.path.isdir(taxonomy):
+            names_file = os.path.join(taxonomy, 'names.dmp')
+            nodes_file = os.path.join(taxonomy, 'nodes.dmp')
+            path = os.path.join(taxonomy, 'taxonomy.sqlite')
+            if not os.path.isfile(path) or os.path.getmtime(path) < max(
+                    os.path.getmtime(names_file),
+                    os.path.getmtime(nodes_file)):
+                self.logger.info('Indexing [{0}] ....'.format(taxonomy))
+                buildIndex(names_file, nodes_file, path)
+            taxonomy = path
+        self.index = LocalIndex(taxonomy, data_source_id=data_source_id,
+                                data_source_title=datasource)
+        self.Id = [data_source_id]
+        self.otherIds = []
+
+    def _query(self, terms, data_source_ids):
+        return {'data': self.index.lookup(terms)}
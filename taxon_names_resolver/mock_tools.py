@@ -0,0 +1,314 @@
+#! /usr/bin/env python
+"""
+Tools for benchmarking the resolver against a local stand-in for the GNR.
+"""
+from __future__ import absolute_import
+
+import argparse
+import gzip
+import io
+import json
+import logging
+import math
+import random
+import threading
+import time
+from six.moves import BaseHTTPServer, socketserver, urllib
+from .resolver import Resolver
+from .http_tools import RetryPolicy
+
+
+# FUNCTIONS
+def lognormalLatency(median, sigma=0.5, per_name=0., seed=None):
+    '''Return latency function of a query of nnames: lognormal about median \
+seconds, plus per_name seconds for each name'''
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    def latency(nnames):
+        with lock:
+            base = rng.lognormvariate(math.log(median), sigma) if median > 0 \
+                else 0.
+        return base + per_name * nnames
+    return latency
+
+
+def percentile(values, q):
+    '''Return the qth percentile of values by nearest rank, None if empty'''
+    if not values:
+        return None
+    values = sorted(values)
+    rank = int(math.ceil(q / 100. * len(values)))
+    return values[max(0, rank - 1)]
+
+
+def benchmark(terms, server, logger=logging.getLogger(''), **kwargs):
+    '''Return dictionary of statistics of searching terms with Resolver.main \
+against server, a running MockGnrServer. Additional keyword arguments are \
+passed to Resolver, nothing is archived by default.'''
+    kwargs.setdefault('archive', None)
+    requests, errors = server.requests, server.errors
+    start = time.time()
+    resolver = Resolver(terms=terms, logger=logger, server=server.url,
+                        **kwargs)
+    resolver.main()
+    seconds = time.time() - start
+    latencies = resolver._res.sizer.latencies
+    return {'names': len(resolver.terms), 'seconds': seconds,
+            'names_per_sec': len(resolver.terms) / seconds,
+            'chunks': len(latencies), 'p50': percentile(latencies, 50),
+            'p99': percentile(latencies, 99),
+            'retries': resolver._res.policy.retries,
+            'requests': server.requests - requests,
+            'errors': server.errors - errors,
+            'resolved': len([term for term in resolver.terms if
+                             resolver._store[term]])}
+
+
+# CLASSES
+class MockTaxonomy(object):
+    """Mock taxonomy class: a synthetic taxonomy of ngenera genera of \
+nspecies species each. The primary data source knows the accepted names, \
+the other data sources also know a synonym of every species, whose canonical \
+form is the accepted name."""
+
+    def __init__(self, ngenera=100, nspecies=10, primary='NCBI',
+                 others=('Catalogue of Life', 'GBIF Backbone Taxonomy')):
+        self.ngenera = ngenera
+        self.nspecies = nspecies
+        self.data_sources = [{'id': 4, 'title': primary}]
+        for i, title in enumerate(others):
+            self.data_sources.append({'id': 100 + i, 'title': title})
+        self._titles = dict([(ds['id'], ds['title']) for ds in
+                             self.data_sources])
+
+    def names(self, n, synonyms=0., unknown=0., seed=None):
+        """Return n names to search: accepted names, with a proportion of \
+synonyms and of unknown species of known genera"""
+        rng = random.Random(seed)
+        res = []
+        for i in range(n):
+            g = rng.randrange(self.ngenera)
+            s = rng.randrange(self.nspecies)
+            draw = rng.random()
+            if draw < synonyms:
+                res.append('Synonymus{0} species{1}'.format(g, s))
+            elif draw < synonyms + unknown:
+                res.append('Genus{0} unknown{1}'.format(g, i))
+            else:
+                res.append('Genus{0} species{1}'.format(g, s))
+        return res
+
+    def _parse(self, name):
+        # return (kind, genus, species) of name, None if not in taxonomy
+        words = name.split()
+        try:
+            if words[0].startswith('Genus'):
+                kind, g = 'accepted', int(words[0][5:])
+            elif words[0].startswith('Synonymus'):
+                kind, g = 'synonym', int(words[0][9:])
+            else:
+                return None
+            s = None
+            if len(words) == 2 and words[1].startswith('species'):
+                s = int(words[1][7:])
+            elif len(words) != 1:
+                return None
+        except ValueError:
+            return None
+        if g >= self.ngenera or (s is not None and s >= self.nspecies) or \
+                (kind == 'synonym' and s is None):
+            return None
+        return kind, g, s
+
+    def lookup(self, name, ds_id):
+        """Return GNR style results of name in data source ds_id"""
+        parsed = self._parse(name)
+        if parsed is None or ds_id not in self._titles:
+            return []
+        kind, g, s = parsed
+        if kind == 'synonym' and ds_id == self.data_sources[0]['id']:
+            return []
+        genus = 'Genus{0}'.format(g)
+        path = ['Life', genus]
+        ranks = ['kingdom', 'genus']
+        ids = ['1', str(10 + g)]
+        if s is not None:
+            path.append('{0} species{1}'.format(genus, s))
+            ranks.append('species')
+            ids.append(str(10 + self.ngenera + g * self.nspecies + s))
+        return [{'classification_path': '|' + '|'.join(path),
+                 'classification_path_ranks': '|' + '|'.join(ranks),
+                 'classification_path_ids': '|' + '|'.join(ids),
+                 'data_source_title': self._titles[ds_id],
+                 'data_source_id': ds_id, 'match_type': 1, 'score': 0.988,
+                 'prescore': '3|0|0', 'name_string': name,
+                 'canonical_form': path[-1], 'taxon_id': ids[-1],
+                 'gni_uuid': None}]
+
+    def resolve(self, names, ds_ids):
+        """Return GNR style response to a search of names in ds_ids"""
+        data = []
+        for name in names:
+            record = {'supplied_name_string': name}
+            results = [result for ds_id in ds_ids for result in
+                       self.lookup(name, ds_id)]
+            if len(results) > 0:
+                record['results'] = results
+            data.append(record)
+        return {'data': data}
+
+
+class _MockHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # answer GNR requests from the server's taxonomy
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self._answer(urllib.parse.urlsplit(self.path).query)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        self._answer(self.rfile.read(length).decode('utf8'))
+
+    def _answer(self, query):
+        mock = self.server.mock
+        path = urllib.parse.urlsplit(self.path).path
+        params = urllib.parse.parse_qs(query)
+        names = [name for each in params.get('names', []) for name in
+                 each.split('|')]
+        if not mock._pause(len(names)):
+            return self._send(mock.error_status, b'{}')
+        if path == '/data_sources.json':
+            body = mock.taxonomy.data_sources
+        elif path == '/name_resolvers.json':
+            ds_ids = [int(ds_id) for each in params.get('data_source_ids', [])
+                      for ds_id in each.split('|') if ds_id]
+            body = mock.taxonomy.resolve(names, ds_ids)
+        else:
+            return self._send(404, b'{}')
+        self._send(200, json.dumps(body).encode('utf8'))
+
+    def _send(self, status, body):
+        gzipped = 'gzip' in self.headers.get('Accept-Encoding', '')
+        if gzipped:
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(body)
+            body = buf.getvalue()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        if gzipped:
+            self.send_header('Content-Encoding', 'gzip')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class _ThreadingServer(socketserver.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class MockGnrServer(object):
+    """Mock GNR server class: serve name_resolvers.json and data_sources.json \
+from a MockTaxonomy on a local port. Each request waits latency seconds (a \
+number, or a function of the number of names, see lognormalLatency) and fails \
+with error_status at error_rate. Counts requests, errors and names. Use as a \
+context manager, or start and stop."""
+
+    def __init__(self, taxonomy=None, latency=0., error_rate=0.,
+                 error_status=503, seed=None, host='127.0.0.1', port=0):
+        if taxonomy is None:
+            taxonomy = MockTaxonomy()
+        self.taxonomy = taxonomy
+        self.latency = latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.requests = 0
+        self.errors = 0
+        self.names = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = _ThreadingServer((host, port), _MockHandler)
+        self._httpd.mock = self
+        self.url = 'http://{0}:{1}'.format(*self._httpd.server_address[:2])
+        self._thread = None
+
+    def _pause(self, nnames):
+        # wait out latency, return False if the request is to fail
+        with self._lock:
+            self.requests += 1
+            self.names += nnames
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        latency = self.latency(nnames) if callable(self.latency) else \
+            self.latency
+        if latency > 0:
+            time.sleep(latency)
+        return not fail
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+
+# MAIN
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the resolver '
+                                     'against a local mock GNR server')
+    parser.add_argument('-nnames', type=int, default=10000,
+                        help='number of names to search (default 10000)')
+    parser.add_argument('-synonyms', type=float, default=0.05,
+                        help='proportion of synonyms (default 0.05)')
+    parser.add_argument('-unknown', type=float, default=0.05,
+                        help='proportion of unknown species (default 0.05)')
+    parser.add_argument('-latency', type=float, default=0.2,
+                        help='median seconds per query (default 0.2)')
+    parser.add_argument('-sigma', type=float, default=0.5,
+                        help='spread of lognormal latency (default 0.5)')
+    parser.add_argument('-pername', type=float, default=0.,
+                        help='additional seconds per name (default 0)')
+    parser.add_argument('-errorrate', type=float, default=0.,
+                        help='proportion of queries failing (default 0)')
+    parser.add_argument('-concurrency', '-c', type=int, default=1,
+                        help='number of chunks to query at once (default 1)')
+    parser.add_argument('-dsconcurrency', type=int, default=1,
+                        help='number of other datasources to search at once '
+                        '(default 1)')
+    parser.add_argument('--post', action='store_true',
+                        help='send names in the request body')
+    args = parser.parse_args()
+    taxonomy = MockTaxonomy(ngenera=max(1, args.nnames // 10))
+    terms = taxonomy.names(args.nnames, synonyms=args.synonyms,
+                           unknown=args.unknown, seed=1)
+    latency = lognormalLatency(args.latency, args.sigma, args.pername, seed=1)
+    # retry quickly, the mock server does not need time to recover
+    policy = RetryPolicy(base=0.1, cap=1)
+    with MockGnrServer(taxonomy, latency=latency,
+                       error_rate=args.errorrate, seed=1) as server:
+        res = benchmark(terms, server, concurrency=args.concurrency,
+                        ds_concurrency=args.dsconcurrency, post=args.post,
+                        policy=policy)
+    for key in ['names', 'resolved', 'seconds', 'names_per_sec', 'requests',
+                'chunks', 'p50', 'p99', 'retries', 'errors']:
+        print('{0}: {1}'.format(key, res[key]))
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,6 @@
 #! /usr/bin/env python
 # D.J. Bennett
 # 16/05/2014
-# TODO: use a minimal score (avoid calling hybrids 'species')
 # TODO: create a stats-out function
 """
 Resolver class for parsing GNR records.
@@ -10,16 +9,34 @@ from __future__ import absolute_import
 
 import json
 import os
-import csv
 import re
-import copy
 import logging
+import collections
+import shutil
+import tempfile
 from .gnr_tools import GnrStore
+from .gnr_tools import CompactGnrStore
 from .gnr_tools import GnrResolver
+from .local_tools import LocalGnrResolver
+from .cache_tools import NegativeCache
+from .checkpoint_tools import Checkpoint
+from .sieve_tools import Sieve
+from .writer_tools import KEY_TERMS
+from .writer_tools import ResultWriter
 import six
 from six.moves import zip, urllib
 
 
+# FUNCTIONS
+def readTerms(input_file):
+    '''Return names in input_file, one per line, without blank lines'''
+    terms = []
+    with open(input_file) as names:
+        for name in names:
+            terms.append(name.strip())
+    return [term for term in terms if not term == '']
+
+
 # CLASSES
 class EncodingError(Exception):
     pass
@@ -31,22 +48,50 @@ through GNR. All output written in 'resolved_names' folder.
 See https://github.com/DomBennett/TaxonNamesResolver for details."""
 
     def __init__(self, input_file=None, datasource='NCBI', taxon_id=None,
-                 terms=None, lowrank=False, logger=logging.getLogger('')):
+                 terms=None, lowrank=False, logger=logging.getLogger(''),
+                 refresh=False, taxonomy=None, checkpoint=True, resume=None,
+                 gnr_resolver=None, compact=False, exclude=None, sieve=None,
+                 stream=None, **kwargs):
+        """Resolve terms, or those of input_file, against datasource:
+- refresh: search again names the cachedir recently left unresolved
+- taxonomy: resolve offline against NCBI names.dmp and nodes.dmp, or an \
+index built from them
+- checkpoint: checkpoint progress in the output folder after each chunk
+- resume: output folder of a run that died, to carry on from
+- gnr_resolver: GnrResolver shared with other Resolvers
+- compact: hold results in a CompactGnrStore to save memory
+- exclude: ID or list of IDs of clades whose results are dropped
+- sieve: Sieve reducing names to one record, by default of lowrank; with \
+filters, names with one record are sieved too
+- stream: ResultWriter given each name once final, closed by main
+Other keyword arguments (e.g. concurrency) are passed to GnrResolver."""
         # add logger
         self.logger = logger
         # organising dirs
         self.directory = os.getcwd()
-        self.outdir = os.path.join(self.directory, 'resolved_names')
+        self.outdir = os.path.join(self.directory, resume or 'resolved_names')
         if not os.path.exists(self.outdir):
             os.makedirs(self.outdir)
+        self._checkpoint = None
+        self._resumed = None
+        if checkpoint or resume:
+            self._checkpoint = Checkpoint(self.outdir)
+        if resume:
+            state, chunks = self._checkpoint.load()
+            if state is None:
+                if not input_file and terms is None:
+                    raise ValueError('No checkpoint in [{0}] to resume and no '
+                                     'names given'.format(self.outdir))
+                self.logger.info('No checkpoint in [{0}] to resume, starting '
+                                 'afresh'.format(self.outdir))
+            else:
+                self._resumed = (state, chunks)
+                terms = state['terms']
+                input_file = None
         if input_file:
             input_file = os.path.join(self.directory, input_file)
             # reading in terms
-            terms = []
-            with open(input_file) as names:
-                for name in names:
-                    terms.append(name.strip())
-            terms = [term for term in terms if not term == '']
+            terms = readTerms(input_file)
         else:
             if not terms:
                 self.logger.info("No terms provided")
@@ -57,18 +102,53 @@ See https://github.com/DomBennett/TaxonNamesResolver for details."""
         # init dep classes
         self._check(terms)
         self.terms = terms
-        self._res = GnrResolver(logger=self.logger, datasource=datasource)
+        kwargs.setdefault('archive_dir', self.outdir)
+        if gnr_resolver is not None:
+            self._res = gnr_resolver
+        elif taxonomy:
+            self._res = LocalGnrResolver(self.logger, taxonomy,
+                                         datasource=datasource, **kwargs)
+        else:
+            self._res = GnrResolver(logger=self.logger, datasource=datasource,
+                                    **kwargs)
         self.primary_datasource = datasource
-        self._store = GnrStore(terms, tax_group=taxon_id, logger=self.logger)
-        # http://resolver.globalnames.org/api
-        self.key_terms = ['query_name', 'classification_path',
-                          'data_source_title', 'match_type', 'score',
-                          'classification_path_ranks', 'name_string',
-                          'canonical_form', 'classification_path_ids',
-                          'prescore', 'data_source_id', 'taxon_id', 'gni_uuid']
+        self.refresh = refresh
+        store_class = CompactGnrStore if compact else GnrStore
+        self._store = store_class(terms, tax_group=taxon_id,
+                                  exclude=exclude, logger=self.logger)
+        self._negative = None
+        if getattr(self._res, 'cachedir', None):
+            # names unresolved with another data source or filter may resolve
+            scope = [datasource] + [sorted(ids) if ids else None for ids in
+                                    (self._store.tax_group,
+                                     self._store.exclude)]
+            self._negative = NegativeCache(self._res.cachedir, scope=scope)
+        if self._resumed is not None:
+            self._store.update(self._resumed[0]['store'])
+            self._res.write_counter = self._resumed[0]['write_counter']
+        self.key_terms = list(KEY_TERMS)
         self.lowrank = lowrank  # return lowest ranked match
+        self._given_sieve = sieve
+        self._default_sieve = None
+        self._paths = {}  # split paths of retrieveMany
+        self.stream = stream
+        self._streamed = set()  # names written to stream
         # self.tnr_obj = [] # this will hold all output
 
+    @property
+    def sieve(self):
+        """Sieve given, else a Sieve of lowrank"""
+        if self._given_sieve is not None:
+            return self._given_sieve
+        if self._default_sieve is None or \
+                self._default_sieve.lowrank != self.lowrank:
+            self._default_sieve = Sieve(lowrank=self.lowrank)
+        return self._default_sieve
+
+    @sieve.setter
+    def sieve(self, sieve):
+        self._given_sieve = sieve
+
     def _check(self, terms):
         """Check terms do not contain unknown characters"""
         for t in terms:
@@ -81,37 +161,94 @@ See https://github.com/DomBennett/TaxonNamesResolver for details."""
 
     def main(self):
         """Search and sieve query names."""
+        for search_terms, prelim, sink in self._searches():
+            self._res.search(search_terms, prelim=prelim, sink=sink)
+        self._res.flush()
+        self._res.report()
+
+    def amain(self, inflight=10):
+        """Return a coroutine that searches and sieves query names without \
+blocking the event loop, with up to `inflight` queries at once. Asynchronous \
+counterpart of main, requires Python 3.5+."""
+        from .async_tools import amain
+        return amain(self, inflight=inflight)
+
+    def _searches(self):
+        """Generator of searches: yields the terms to search, whether the \
+search is preliminary and a sink adding each chunk of results to the store as \
+it arrives. Multiple records are sieved once searching is complete."""
         # TODO: Break up, too complex
         primary_bool = True
         no_records = True
         nsearch = 1
         search_terms = self.terms
-        original_names = []
+        renames = []
+        known = set()
+        if self._resumed is not None:
+            state, chunks = self._resumed
+            self._resumed = None
+            nsearch = state['nsearch']
+            primary_bool = state['primary']
+            search_terms = state['search_terms']
+            renames = [tuple(each) for each in state['renames']]
+            known = set(state['known'])
+            if primary_bool and chunks:
+                # add the chunks already searched, search the rest, adding
+                #  to their archive
+                self._res.appending.add(self._res.write_counter)
+                sink = self._sink(renames, journal=False, stream=True)
+                done = set()
+                for records in chunks:
+                    sink(records)
+                    done.update([record['supplied_name_string'] for record
+                                 in records])
+                search_terms = [e for e in search_terms if e not in done]
+            # other datasource searches are started again
+            self.logger.info('Resuming search [{0}] with [{1}] names ...'.
+                             format(nsearch, len(search_terms)))
         while True:
+            if self._checkpoint is not None:
+                self._checkpoint.save({
+                    'terms': self.terms, 'nsearch': nsearch,
+                    'primary': primary_bool, 'search_terms': search_terms,
+                    'renames': renames, 'known': list(known),
+                    'store': dict(self._store.items()),
+                    'write_counter': self._res.write_counter})
             if primary_bool:
                 self.logger.info('Searching [{0}] ...'.format(
                     self.primary_datasource))
             else:
                 self.logger.info('Searching other datasources ...')
-            res = self._res.search(search_terms, prelim=primary_bool)
-            if nsearch > 2 and res:
-                # if second search failed, look up alternative names
-                for each_res, original_name in zip(res, original_names):
-                    each_res['supplied_name_string'] = original_name
-            self._store.add(res)
+            # names searched in place of others, if second search failed
+            if search_terms:
+                # names are only searched once in a primary search, so
+                #  their results are final as soon as they arrive
+                yield search_terms, primary_bool, self._sink(
+                    renames, stream=primary_bool)
+            if self.stream is not None:
+                self._stream(list(self._store.resolved) +
+                             list(self._store.multiple))
+                # let readers see every name of the pass before the next
+                self.stream.flush()
             # Check for returns without records
             no_records = self._count(nrecords=1)
+            if no_records and nsearch == 1 and self._negative is not None \
+                    and not self.refresh:
+                # skip fallback searches for names known to be unresolvable
+                known = self._negative.known(no_records)
+                if known:
+                    self.logger.info('Skipping [{0}] names known to be '
+                                     'unresolvable ...'.format(len(known)))
+                    no_records = [e for e in no_records if e not in known]
             if no_records:
                 if nsearch == 1:
                     primary_bool = False
                 elif nsearch == 2:
-                    original_names = no_records
                     # genus names
-                    no_records = [e.split()[0] for e in no_records]
+                    renames, no_records = self._genera(no_records)
                     primary_bool = True
                 elif nsearch == 3:
-                    original_names = no_records
-                    no_records = [e.split()[0] for e in no_records]
+                    renames, no_records = self._genera(no_records)
                     primary_bool = False
                 else:
                     break
@@ -119,12 +256,87 @@ See https://github.com/DomBennett/TaxonNamesResolver for details."""
                 break
             nsearch += 1
             search_terms = no_records
-        # Check for multiple records
-        multi_records = self._count(greater=True, nrecords=1)
+        if self._negative is not None:
+            unresolved = set(self._count(nrecords=1) or [])
+            self._negative.add([e for e in unresolved if e not in known])
+            self._negative.discard([e for e in self.terms if e not in
+                                    unresolved])
+            self._negative.save()
+        # Check for multiple records, or any if results may be filtered
+        multi_records = self._count(greater=True,
+                                    nrecords=0 if self.sieve.filters else 1)
         if multi_records:
             self.logger.info('Choosing best records to return ...')
             res = self._sieve(multi_records)
             self._store.replace(res)
+        self.logger.info(self._store.report())
+        if self.stream is not None:
+            self._stream(list(self._store.unresolved), final=True)
+            self.stream.close()
+            self.logger.info('Wrote [{0}] resolved and [{1}] unresolved names '
+                             'to [{2}]'.format(self.stream.nresolved,
+                                               self.stream.nunresolved,
+                                               self.stream.path))
+        if self._checkpoint is not None:
+            self._checkpoint.clear()
+
+    def _genera(self, names):
+        """Return renames of (genus, name) for names, and the genera to \
+search, each once however many names share it"""
+        renames = [(name.split()[0], name) for name in names]
+        genera = list(collections.OrderedDict.fromkeys(
+            [genus for genus, _ in renames]))
+        self.logger.info('Searching [{0}] genera for [{1}] names ...'.format(
+            len(genera), len(names)))
+        return renames, genera
+
+    def _sink(self, renames=(), journal=True, stream=False):
+        """Return function adding a chunk of records to the store. Records \
+of names searched in place of others, renames of (searched, original), are \
+given to every original name. Chunks are journaled in the checkpoint and, if \
+stream, their names written to the stream."""
+        originals = {}
+        for searched, original in renames:
+            originals.setdefault(searched, []).append(original)
+
+        def sink(records):
+            if journal and self._checkpoint is not None:
+                self._checkpoint.record(records)
+            fanned = []
+            for record in records:
+                names = originals.get(record['supplied_name_string'])
+                if not names:
+                    fanned.append(record)
+                    continue
+                for name in names:
+                    fanned_record = dict(record)
+                    fanned_record['supplied_name_string'] = name
+                    fanned.append(fanned_record)
+            self._store.add(fanned)
+            if stream:
+                self._stream([record['supplied_name_string'] for record in
+                              fanned])
+        return sink
+
+    def _stream(self, names, final=False):
+        # write names not yet written to the stream, with the results the
+        #  sieve will keep; names without results may yet be resolved by
+        #  another search, so are only written if final
+        if self.stream is None:
+            return
+        for name in names:
+            if name in self._streamed or name not in self._store:
+                continue
+            results = self._store[name]
+            if len(results) == 0 and not final:
+                continue
+            self._streamed.add(name)
+            if self.stream.all_records:
+                results = [result for result in results if
+                           self.sieve.keep(result)]
+            else:
+                results = self.sieve.select(results)
+            self.stream.write(name, results)
 
     # def extract(self, what): # depends on tnr
     #    lkeys = ['qnames', 'rnames', 'taxonids', 'ranks']
@@ -140,17 +352,21 @@ See https://github.com/DomBennett/TaxonNamesResolver for details."""
 
     def _count(self, greater=False, nrecords=0):
         # return a list of all keys that have records
-        #  greater or less than nrecords
-        GnrStore = self._store
-        assessed = []
-        lens = [len(GnrStore[key]) for key in list(GnrStore.keys())]
-        if greater:
-            len_bools = [each > nrecords for each in lens]
+        #  greater or less than nrecords, from the store's live sets of terms
+        #  with no, one and multiple records where these suffice
+        store = self._store
+        states = [store.unresolved, store.resolved, store.multiple]
+        if greater and nrecords < 2:
+            assessed = [key for state in states[nrecords + 1:] for key in
+                        state]
+        elif not greater and nrecords <= 2:
+            assessed = [key for state in states[:nrecords] for key in state]
+        elif greater:
+            assessed = [key for key in store.multiple if
+                        len(store[key]) > nrecords]
         else:
-            len_bools = [each < nrecords for each in lens]
-        for i, key in enumerate(GnrStore.keys()):
-            if len_bools[i]:
-                assessed.append(key)
+            assessed = [key for key in store.keys() if
+                        len(store[key]) < nrecords]
         if len(assessed) == 0:
             return False
         else:
@@ -158,104 +374,29 @@ See https://github.com/DomBennett/TaxonNamesResolver for details."""
 
     def _sieve(self, multiple_records):
         """Return json object without multiple returns per resolved name.\
-Names with multiple records are reduced by finding the name in the clade of\
-interest, have the highest score, have the lowest taxonomic rank (if lowrank is
-true) and/or are the first item returned."""
-        # TODO: Break up, too complex
-        GnrStore = self._store
-
-        def writeAsJson(term, results):
-            record = {'supplied_name_string': term}
-            if len(results) > 0:
-                record['results'] = results
-            return record
-
-        def boolResults(results, bool_li, rand=False):
-            if rand:
-                # choose first record (most likely best?)
-                results = [results[0]]
-            elif sum(bool_li) == 1:
-                results = [results[bool_li.index(1)]]
-            elif sum(bool_li) == 0:
-                # return 'no_record'
-                return []
-            else:
-                results = [result for i, result in enumerate(results) if
-                           bool_li[i]]
-            return results
+Names with multiple records are reduced by the sieve: by default to the record \
+with the highest score, of the lowest taxonomic rank (if lowrank is true), \
+first returned."""
+        return self.sieve.sieve(self._store, multiple_records)
 
-        sieved = []
-        ranks = ['species', 'genus', 'family', 'order', 'superorder', 'class',
-                 'superclass', 'subphylum', 'phylum', 'kingdom',
-                 'superkingdom']
-        for term in multiple_records:
-            results = GnrStore[term]
-            while len(results) > 1:
-                # choose result with best score
-                scores = [result['score'] for result in results]
-                bool_score = [1 if score == max(scores) else 0 for score in
-                              scores]
-                results = boolResults(results, bool_score)
-                # choose result resolved to lowest taxonomic rank
-                if self.lowrank:
-                    res_ranks = [result['classification_path_ranks'].
-                                 split('|') for result in results]
-                    # calculate 'rank scores' for named and un-named ranks
-                    nmd_rnks = []
-                    unnmd_rnks = []
-                    for rs in res_ranks:
-                        nmd_rnks.append(min([j for j,e in enumerate(ranks) if
-                                             e in rs]))
-                        unnmd_rnk = [j for j,e in enumerate(rs) if
-                                     e == ranks[nmd_rnks[-1]]][0]
-                        unnmd_rnk -= len(rs)
-                        unnmd_rnks.append(unnmd_rnk)
-                    # calculate bool
-                    unnmd_rnks = [e if nmd_rnks[j] == min(nmd_rnks) else 0 for
-                                  j,e in enumerate(unnmd_rnks)]
-                    bool_rank = [1 if e == min(unnmd_rnks) else 0 for e in
-                                 unnmd_rnks]
-                    results = boolResults(results, bool_rank)
-                results = boolResults(results, [], rand=True)
-            record = writeAsJson(term, results)
-            sieved.append(record)
-        return sieved
-
-    def write(self):
+    def write(self, outdir=None, terms=None, fmt='csv', compress=False,
+              all_records=False):
         """Write csv file of resolved names and txt file of unresolved names.
+Only terms are written if given, to outdir if given. Format fmt may also be \
+tsv or ndjson, gzipped if compress, see ResultWriter.
         """
-        csv_file = os.path.join(self.outdir, 'search_results.csv')
-        txt_file = os.path.join(self.outdir, 'unresolved.txt')
-        headers = self.key_terms
-        unresolved = []
-        with open(csv_file, 'w') as file:
-            writer = csv.writer(file)
-            writer.writerow(headers)
-            for key in list(self._store.keys()):
-                results = self._store[key]
-                if len(results) == 0:
-                    unresolved.append(key)
-                else:
-                    row = [key]
-                    for key_term in headers[1:]:
-                        element = results[0][key_term]
-                        # GNR returns UTF-8, csv requires ascii
-                        #
-                        # *** Note ***
-                        # According to all docs for csv versions >= 2.6, csv
-                        # can handle either UTF-8 or ascii, just not Unicode.
-                        # In py3, the following two lines result in csv printing
-                        # the element with a bitstring. If GNR is actually
-                        # returning UTF-8, it seems easiest to just drop these
-
-                        # if 'encode' in dir(element):
-                        #     element = element.encode('ascii')
-                        row.append(element)
-                    writer.writerow(row)
-        if len(unresolved) > 0:
-            with open(txt_file, 'w') as file:
-                for name in unresolved:
-                    file.write("{0}\n".format(name))
+        if outdir is None:
+            outdir = self.outdir
+        if terms is None:
+            terms = list(self._store.keys())
+        writer = ResultWriter(outdir, fmt=fmt, compress=compress,
+                              all_records=all_records,
+                              key_terms=self.key_terms)
+        try:
+            for key in terms:
+                writer.write(key, self._store[key])
+        finally:
+            writer.close()
 
     def retrieve(self, key_term):
         """Return data for key term specified for each resolved name as a list.
@@ -264,20 +405,122 @@ Possible terms (02/12/2013): 'query_name', 'classification_path',
 'name_string', 'canonical_form',\
 'classification_path_ids', 'prescore', 'data_source_id', 'taxon_id',
 'gni_uuid'"""
-        if key_term not in self.key_terms:
-            raise IndexError('Term given is invalid! Check doc string for \
-valid terms.')
-        store = self._store
-        retrieved = []
-        for key in list(store.keys()):
-            # take copy, so changes made to the returned list do not affect
-            #  store
-            record = copy.deepcopy(store[key])
-            if len(record) > 0:
-                if key_term == 'query_name':
-                    retrieved.append(key)
-                else:
-                    retrieved.append(record[0][key_term])
+        retrieved = self.retrieveMany([key_term])[0]
         if re.search('path', key_term):
-            retrieved = [[r2 for r2 in r1.split('|')[1:]] for r1 in retrieved]
+            # lists, so changes made to them do not affect the cached paths
+            retrieved = [list(path) for path in retrieved]
+        return retrieved
+
+    def retrieveMany(self, key_terms):
+        """Return list of the data for each of key_terms for each resolved \
+name, as lists in the same order, in one pass over the store (see retrieve \
+for possible terms). Paths are split into tuples cached between calls. \
+Nothing is copied, the values are read-only views of the store."""
+        for key_term in key_terms:
+            if key_term not in self.key_terms:
+                raise IndexError('Term given is invalid! Check doc string \
+for valid terms.')
+        fields = [key_term for key_term in key_terms if
+                  key_term != 'query_name']
+        terms, columns = self._store.columns(fields)
+        columns = dict(zip(fields, columns))
+        retrieved = []
+        for key_term in key_terms:
+            if key_term == 'query_name':
+                retrieved.append(list(terms))
+            elif re.search('path', key_term):
+                retrieved.append([self._split(path) for path in
+                                  columns[key_term]])
+            else:
+                retrieved.append(columns[key_term])
         return retrieved
+
+    def _split(self, path):
+        # return tuple of the names in path, cached
+        try:
+            return self._paths[path]
+        except KeyError:
+            split = tuple(path.split('|')[1:])
+            self._paths[path] = split
+            return split
+
+
+class ResolverPool(object):
+    """Resolver pool class: resolve the names of many jobs together"""
+
+    def __init__(self, datasource='NCBI', lowrank=False,
+                 logger=logging.getLogger(''), outdir=None, refresh=False,
+                 taxonomy=None, compact=False, sieve=None, **kwargs):
+        """Resolve jobs with the same taxon_id and exclude together, each \
+unique name searched once, all sharing one GnrResolver:
+- outdir: folder of each job's results, outdir/<job name>
+- lowrank, refresh, taxonomy, compact, sieve: as for Resolver
+Without a cachedir, results are cached for the run only. Other keyword \
+arguments are passed to GnrResolver."""
+        self.logger = logger
+        self.compact = compact
+        self.sieve = sieve
+        self.datasource = datasource
+        self.lowrank = lowrank
+        if outdir is None:
+            outdir = os.path.join(os.getcwd(), 'resolved_names')
+        self.outdir = outdir
+        self.refresh = refresh
+        self.taxonomy = taxonomy
+        self.kwargs = kwargs
+        self.jobs = collections.OrderedDict()
+        self.resolvers = {}  # job name: Resolver that searched its names
+
+    def add(self, name, input_file=None, terms=None, taxon_id=None,
+            exclude=None):
+        """Queue job of terms, or of names in input_file"""
+        if input_file:
+            terms = readTerms(input_file)
+        self.jobs[name] = (list(set(terms or [])), taxon_id, exclude)
+
+    def run(self):
+        """Search the names of all queued jobs and write their results"""
+        groups = collections.OrderedDict()
+        for name, (terms, taxon_id, exclude) in self.jobs.items():
+            key = tuple([tuple(sorted([str(e) for e in ids])) if
+                         isinstance(ids, list) else ids for ids in
+                         (taxon_id, exclude)])
+            groups.setdefault(key, []).append(name)
+        kwargs = dict(self.kwargs)
+        kwargs.setdefault('archive_dir', self.outdir)
+        tmpdir = None
+        refresh = self.refresh
+        if not kwargs.get('cachedir'):
+            tmpdir = tempfile.mkdtemp()
+            kwargs['cachedir'] = tmpdir
+            # names unresolved in one group may resolve in another
+            refresh = True
+        if self.taxonomy:
+            res = LocalGnrResolver(self.logger, self.taxonomy,
+                                   datasource=self.datasource, **kwargs)
+        else:
+            res = GnrResolver(logger=self.logger, datasource=self.datasource,
+                              **kwargs)
+        try:
+            for names in groups.values():
+                terms = list(collections.OrderedDict.fromkeys(
+                    [term for name in names for term in self.jobs[name][0]]))
+                self.logger.info('Resolving [{0}] jobs of [{1}] names '
+                                 '...'.format(len(names), len(terms)))
+                resolver = Resolver(terms=terms, datasource=self.datasource,
+                                    taxon_id=self.jobs[names[0]][1],
+                                    exclude=self.jobs[names[0]][2],
+                                    lowrank=self.lowrank, logger=self.logger,
+                                    refresh=refresh, checkpoint=False,
+                                    gnr_resolver=res, compact=self.compact,
+                                    sieve=self.sieve)
+                resolver.main()
+                for name in names:
+                    resolver.write(os.path.join(self.outdir, name),
+                                   self.jobs[name][0])
+                    self.resolvers[name] = resolver
+        finally:
+            res.flush()
+            if tmpdir is not None:
+                res.cache.close()
+                shutil.rmtree(tmpdir)
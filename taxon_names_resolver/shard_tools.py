@@ -0,0 +1,145 @@
+#! /usr/bin/env python
+"""
+Tools for resolving names in shards, in separate processes or on separate
+hosts sharing a filesystem, and merging their results.
+"""
+from __future__ import absolute_import
+
+import csv
+import hashlib
+import multiprocessing
+import os
+from .resolver import Resolver
+from .cache_tools import normalise
+from .checkpoint_tools import Checkpoint
+
+
+# FUNCTIONS
+def shardOf(name, nshards):
+    '''Return shard of name, from a hash of its normalised form that is the \
+same in every process'''
+    digest = hashlib.md5(normalise(name).encode('utf8')).hexdigest()
+    return int(digest[:8], 16) % nshards
+
+
+def splitShards(terms, nshards):
+    '''Return list of the terms of each of nshards shards'''
+    shards = [[] for _ in range(nshards)]
+    for term in terms:
+        shards[shardOf(term, nshards)].append(term)
+    return shards
+
+
+def shardDir(shard, nshards, outdir=None):
+    '''Return folder of results of shard of nshards in outdir'''
+    if outdir is None:
+        outdir = os.path.join(os.getcwd(), 'resolved_names')
+    return os.path.join(outdir, 'shard_{0}_of_{1}'.format(shard, nshards))
+
+
+def resolveShard(terms, shard, nshards, outdir=None, **kwargs):
+    '''Resolve the terms in shard of nshards with a Resolver, writing its \
+results to the shard's folder in outdir. A shard already complete for the \
+same terms is skipped, one that died is resumed from its checkpoint. \
+Additional keyword arguments are passed to Resolver. Return the shard's \
+folder.'''
+    shard_dir = shardDir(shard, nshards, outdir)
+    done_file = os.path.join(shard_dir, 'shard.done')
+    terms_file = os.path.join(shard_dir, 'shard.terms')
+    terms = sorted(set([term for term in terms if
+                        shardOf(term, nshards) == shard]))
+    digest = hashlib.md5('\n'.join(terms).encode('utf8')).hexdigest()
+    if os.path.isfile(done_file):
+        with open(done_file) as file:
+            if file.read().strip() == digest:
+                return shard_dir
+        os.remove(done_file)
+    # a checkpoint left by a run of other terms is not resumed
+    started = None
+    if os.path.isfile(terms_file):
+        with open(terms_file) as file:
+            started = file.read().strip()
+    if started != digest:
+        if os.path.isdir(shard_dir):
+            Checkpoint(shard_dir).clear()
+        else:
+            os.makedirs(shard_dir)
+        with open(terms_file, 'w') as file:
+            file.write(digest)
+    resolver = Resolver(terms=terms, resume=shard_dir, **kwargs)
+    resolver.main()
+    _removeUnresolved(shard_dir)
+    resolver.write()
+    with open(done_file, 'w') as file:
+        file.write(digest)
+    return shard_dir
+
+
+def _removeUnresolved(outdir):
+    # unresolved.txt is only written if there are unresolved names, remove
+    #  any left by an earlier run
+    txt_file = os.path.join(outdir, 'unresolved.txt')
+    if os.path.isfile(txt_file):
+        os.remove(txt_file)
+
+
+def _resolveShard(args):
+    # Pool.map passes a single argument
+    terms, shard, nshards, outdir, kwargs = args
+    return resolveShard(terms, shard, nshards, outdir, **kwargs)
+
+
+def resolveShards(terms, nshards, outdir=None, processes=None, **kwargs):
+    '''Resolve terms in nshards shards, each in a separate process with up to \
+processes at once (by default all; 1 resolves them in turn in this process), \
+then merge their results in outdir. Additional keyword arguments are passed \
+to Resolver and must be picklable.'''
+    jobs = [(shard_terms, shard, nshards, outdir, kwargs) for shard,
+            shard_terms in enumerate(splitShards(terms, nshards))]
+    if processes == 1:
+        for job in jobs:
+            _resolveShard(job)
+    else:
+        pool = multiprocessing.Pool(processes or nshards)
+        try:
+            pool.map(_resolveShard, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    mergeShards(nshards, outdir)
+
+
+def mergeShards(nshards, outdir=None):
+    '''Merge results of nshards complete shards into search_results.csv and \
+unresolved.txt in outdir, ordered by name'''
+    if outdir is None:
+        outdir = os.path.join(os.getcwd(), 'resolved_names')
+    headers = None
+    rows = []
+    unresolved = []
+    for shard in range(nshards):
+        shard_dir = shardDir(shard, nshards, outdir)
+        if not os.path.isfile(os.path.join(shard_dir, 'shard.done')):
+            raise IOError('Shard [{0}] of [{1}] is not complete'.format(
+                shard, nshards))
+        with open(os.path.join(shard_dir, 'search_results.csv')) as file:
+            reader = csv.reader(file)
+            headers = next(reader)
+            rows.extend([row for row in reader if row])
+        txt_file = os.path.join(shard_dir, 'unresolved.txt')
+        if os.path.isfile(txt_file):
+            with open(txt_file) as file:
+                unresolved.extend([line.strip() for line in file if
+                                   line.strip()])
+    rows.sort(key=lambda row: row[0])
+    unresolved.sort()
+    _removeUnresolved(outdir)
+    with open(os.path.join(outdir, 'search_results.csv'), 'w') as file:
+        writer = csv.writer(file)
+        writer.writerow(headers)
+        for row in rows:
+            writer.writerow(row)
+    if len(unresolved) > 0:
+        with open(os.path.join(outdir, 'unresolved.txt'), 'w') as file:
+            for name in unresolved:
+                file.write("{0}\n".format(name))
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+"""
+Tools for choosing the best of the records returned for a name.
+"""
+from __future__ import absolute_import
+
+from six.moves import zip
+
+# taxonomic ranks, lowest first
+RANKS = ['species', 'genus', 'family', 'order', 'superorder', 'class',
+         'superclass', 'subphylum', 'phylum', 'kingdom', 'superkingdom']
+
+
+# FUNCTIONS
+def scoreKey(result):
+    '''Return key of result by its score'''
+    return result['score']
+
+
+# CLASSES
+class RankTable(object):
+    """Rank table class: key of a result by the lowest of ranks named in its \
+path, then by how far down the path that rank is, lower ranks and deeper \
+paths being greater. Keys are cached by classification_path_ranks."""
+
+    def __init__(self, ranks=RANKS):
+        self.ranks = list(ranks)
+        self._order = {}
+        for i, rank in enumerate(self.ranks):
+            self._order.setdefault(rank, i)
+        self._keys = {}
+
+    def __call__(self, result):
+        path_ranks = result['classification_path_ranks'] or ''
+        try:
+            return self._keys[path_ranks]
+        except KeyError:
+            pass
+        rs = path_ranks.split('|')
+        # paths without a known rank come last
+        named = min([self._order.get(rank, len(self.ranks)) for rank in rs])
+        unnamed = 0
+        if named < len(self.ranks):
+            unnamed = rs.index(self.ranks[named]) - len(rs)
+        key = (-named, -unnamed)
+        self._keys[path_ranks] = key
+        return key
+
+
+class MinScore(object):
+    """Min score class: filter of results scoring at least score"""
+
+    def __init__(self, score):
+        self.score = score
+
+    def __call__(self, result):
+        return result['score'] >= self.score
+
+
+class PreferSources(object):
+    """Prefer sources class: key of a result by the position of its data \
+source in ids, earlier being greater and unlisted data sources least"""
+
+    def __init__(self, ids):
+        self._order = dict([(str(ds_id), -i) for i, ds_id in enumerate(ids)])
+        self._least = -len(ids)
+
+    def __call__(self, result):
+        return self._order.get(str(result['data_source_id']), self._least)
+
+
+class Sieve(object):
+    """Sieve class: choose the best result of each name in one pass over its \
+results. Results failing any of filters are dropped, then the one with the \
+greatest key is kept, ties going to the first returned. Keys are tuples of \
+the values of keys, functions of a result returning a number or tuple of \
+numbers (by default the score), and if lowrank of a RankTable of ranks."""
+
+    def __init__(self, lowrank=False, keys=(scoreKey,), filters=(),
+                 ranks=RANKS):
+        self.lowrank = lowrank
+        self.keys = list(keys)
+        if lowrank:
+            self.keys.append(RankTable(ranks))
+        self.filters = list(filters)
+
+    def key(self, result):
+        '''Return key of result'''
+        key = ()
+        for fn in self.keys:
+            value = fn(result)
+            key += value if isinstance(value, tuple) else (value,)
+        return key
+
+    def keep(self, result):
+        '''Return True if result passes every filter'''
+        for fn in self.filters:
+            if not fn(result):
+                return False
+        return True
+
+    def select(self, results):
+        '''Return list of the best of results, empty if none pass filters'''
+        best = None
+        best_key = None
+        for result in results:
+            if self.filters and not self.keep(result):
+                continue
+            key = self.key(result)
+            if best is None or key > best_key:
+                best = result
+                best_key = key
+        if best is None:
+            return []
+        return [best]
+
+    def sieve(self, store, terms):
+        '''Return records of terms with only the best of their results in \
+store'''
+        chosen = [self.select(store[term]) for term in terms]
+        records = []
+        for term, results in zip(terms, chosen):
+            record = {'supplied_name_string': term}
+            if len(results) > 0:
+                record['results'] = results
+            records.append(record)
+        return records
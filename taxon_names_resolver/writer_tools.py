@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+"""
+Tools for writing resolved names, at the end of a run or as they resolve.
+"""
+from __future__ import absolute_import
+
+import csv
+import gzip
+import json
+import os
+import threading
+import time
+import six
+
+# http://resolver.globalnames.org/api
+KEY_TERMS = ['query_name', 'classification_path', 'data_source_title',
+             'match_type', 'score', 'classification_path_ranks',
+             'name_string', 'canonical_form', 'classification_path_ids',
+             'prescore', 'data_source_id', 'taxon_id', 'gni_uuid']
+
+
+# CLASSES
+class ResultWriter(object):
+    """Result writer class: write the results of names to outdir one name at \
+a time, as search_results.csv, .tsv (key_terms of each result) or .ndjson \
+(one GNR style record per name), gzipped if compress. Only the first result \
+of each name is written unless all_records. Names without results are \
+written to unresolved.txt, created only if there are any. Output is flushed \
+every flush_every names or flush_secs seconds, so it can be read while \
+names are still being resolved."""
+
+    formats = ('csv', 'tsv', 'ndjson')
+
+    def __init__(self, outdir, fmt='csv', compress=False, all_records=False,
+                 key_terms=KEY_TERMS, flush_every=1000, flush_secs=10.):
+        if fmt not in self.formats:
+            raise ValueError('Format [{0}] is not one of [{1}]'.format(
+                fmt, ', '.join(self.formats)))
+        if not os.path.exists(outdir):
+            os.makedirs(outdir)
+        self.fmt = fmt
+        self.all_records = all_records
+        self.key_terms = list(key_terms)
+        self.flush_every = flush_every
+        self.flush_secs = flush_secs
+        self.path = os.path.join(outdir, 'search_results.' + fmt)
+        if compress:
+            self.path += '.gz'
+            self._file = gzip.open(self.path, 'wb')
+        else:
+            self._file = open(self.path, 'wb')
+        self.txt_path = os.path.join(outdir, 'unresolved.txt')
+        if os.path.isfile(self.txt_path):
+            # left by an earlier run
+            os.remove(self.txt_path)
+        self._txt_file = None
+        self._buffer = six.StringIO()
+        self._csv = None
+        if fmt != 'ndjson':
+            self._csv = csv.writer(self._buffer, delimiter=',' if
+                                   fmt == 'csv' else '\t')
+            self._csv.writerow(self.key_terms)
+        self.nresolved = 0
+        self.nunresolved = 0
+        self._pending = 0
+        self._flushed = time.time()
+        self._lock = threading.Lock()
+
+    def write(self, term, results):
+        """Write term with its results, as unresolved if there are none"""
+        with self._lock:
+            if len(results) == 0:
+                self._unresolved(term)
+            else:
+                if not self.all_records:
+                    results = results[:1]
+                if self._csv is None:
+                    self._buffer.write(json.dumps(
+                        {'supplied_name_string': term,
+                         'results': results}) + '\n')
+                else:
+                    for result in results:
+                        self._csv.writerow([term] + [
+                            result.get(key_term) for key_term in
+                            self.key_terms[1:]])
+                self.nresolved += 1
+            self._pending += 1
+            if self._pending >= self.flush_every or \
+                    time.time() - self._flushed >= self.flush_secs:
+                self._flush()
+
+    def _unresolved(self, term):
+        if self._txt_file is None:
+            self._txt_file = open(self.txt_path, 'w')
+        self._txt_file.write("{0}\n".format(term))
+        if self._csv is None:
+            self._buffer.write(json.dumps({'supplied_name_string': term}) +
+                               '\n')
+        self.nunresolved += 1
+
+    def _flush(self):
+        text = self._buffer.getvalue()
+        if isinstance(text, six.text_type):
+            text = text.encode('utf8')
+        self._file.write(text)
+        self._file.flush()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        if self._txt_file is not None:
+            self._txt_file.flush()
+        self._pending = 0
+        self._flushed = time.time()
+
+    def flush(self):
+        """Write out names held in memory"""
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+            self._file.close()
+            if self._txt_file is not None:
+                self._txt_file.close()
@@ -0,0 +1,124 @@
+#! /usr/bin/env python
+"""
+Tests for archive tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import threading
+from taxon_names_resolver import archive_tools as at
+from taxon_names_resolver import gnr_tools as gt
+
+# TEST DATA
+with open(os.path.join(os.path.dirname(__file__), 'data',
+          'test_firstsearch.json'), 'r') as file:
+    first = json.load(file)
+
+
+# DUMMIES
+class dummy_Logger(object):
+
+    def __init__(self):
+        self.errors = []
+
+    def info(self, msg):
+        pass
+
+    def error(self, msg):
+        self.errors.append(msg)
+
+
+class ArchiveToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = dummy_Logger()
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_rawarchive(self):
+        # archive is the same as dumping all records at once
+        path = os.path.join(self.directory, 'raw.json')
+        archive = at.RawArchive(path)
+        archive.write([])
+        archive.write(first[:2])
+        archive.write(first[2:])
+        archive.close()
+        with open(path, 'r') as f:
+            self.assertEqual(f.read(), json.dumps(first))
+
+    def test_ndjsonarchive(self):
+        path = os.path.join(self.directory, 'raw.ndjson.gz')
+        archive = at.NDJSONArchive(path)
+        archive.write(first[:2])
+        archive.write(first[2:])
+        archive.close()
+        with gzip.open(path, 'rb') as f:
+            res = [json.loads(line.decode('utf8')) for line in f]
+        self.assertEqual(res, first)
+        # a new run replaces the file, a resumed one adds to it
+        for append, expected in [(False, first[:2]),
+                                 (True, first[:2] + first[2:])]:
+            archive = at.NDJSONArchive(path, append=append)
+            archive.write(first[2:] if append else first[:2])
+            archive.close()
+            with gzip.open(path, 'rb') as f:
+                res = [json.loads(line.decode('utf8')) for line in f]
+            self.assertEqual(res, expected)
+
+    def test_writer(self):
+        # writes happen in order away from the calling thread, records may
+        #  change once written
+        writer = at.ArchiveWriter(self.logger, maxsize=2)
+        threads = []
+        chunks = []
+
+        def sink(nsearch, records):
+            threads.append(threading.current_thread())
+            chunks.append((nsearch, records))
+        archive = at.SinkArchive(sink, 3, writer)
+        records = [{'supplied_name_string': 'name{0}'.format(i)} for i in
+                   range(10)]
+        for record in records:
+            archive.write([record])
+            record['supplied_name_string'] = 'renamed'
+        archive.close()
+        writer.flush()
+        self.assertNotIn(threading.current_thread(), threads)
+        self.assertEqual([chunk[0] for chunk in chunks], [3] * 10)
+        self.assertEqual([chunk[1][0]['supplied_name_string'] for chunk in
+                          chunks], ['name{0}'.format(i) for i in range(10)])
+
+    def test_writer_error(self):
+        # failed writes are logged and do not stop the writer
+        writer = at.ArchiveWriter(self.logger)
+
+        def sink(nsearch, records):
+            raise IOError('disk full')
+        at.SinkArchive(sink, 1, writer).write(first)
+        writer.flush()
+        self.assertEqual(len(self.logger.errors), 1)
+
+    def test_resolver_archive(self):
+        # archive mode chooses the archive of each search
+        directory = os.path.join(self.directory, 'raw')
+        resolver = gt.GnrResolver(self.logger, archive='ndjson',
+                                  archive_dir=directory)
+        archive = resolver._archive()
+        self.assertIsInstance(archive, at.NDJSONArchive)
+        self.assertEqual(archive.path, os.path.join(
+            directory, '1_raw_results.ndjson.gz'))
+        resolver.archive = None
+        self.assertIsInstance(resolver._archive(), at.NullArchive)
+        self.assertEqual(resolver.write_counter, 3)
+        self.assertRaises(ValueError, gt.GnrResolver, self.logger,
+                          archive='xml')
+
+if __name__ == '__main__':
+    unittest.main()
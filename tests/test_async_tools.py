@@ -0,0 +1,192 @@
+#! /usr/bin/env python
+"""
+Tests for asynchronous GNR tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import copy
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+import taxon_names_resolver as tnr
+from taxon_names_resolver import mock_tools
+try:
+    import asyncio
+    from taxon_names_resolver import async_tools as at
+except (ImportError, SyntaxError):
+    at = None
+
+# TEST DATA
+# results from the first search
+with open(os.path.join(os.path.dirname(__file__), 'data',
+          'test_firstsearch.json'), 'r') as file:
+    first = json.load(file)
+# results from a thrid search on the original datasource with alt name
+#  with the supplied name corrected
+with open(os.path.join(os.path.dirname(__file__), 'data',
+          'test_fourthsearch.json'), 'r') as file:
+    fourth = json.load(file)
+
+terms = ['GenusA speciesA', 'GenusA speciesB', 'GenusA speciesC',
+         'GenusB speciesD', 'GenusB speciesE', 'GenusC speciesF',
+         'GenusD speciesG', 'GenusE speciesH', 'GenusF speciesI',
+         'GenusG speciesJ']
+
+
+# STUBS
+class dummy_Logger(object):
+
+    def __init__(self):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def warn(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+# add the datasources to prevent talking to GNR
+class Dummy_GnrDataSources(object):
+    def __init__(self, logger, **kwargs):
+        pass
+
+    def byName(self, names, invert=False):
+        if invert:
+            return [1, 2, 3]
+        else:
+            return [4]
+
+
+def done(result):
+    # return an awaitable that has already completed
+    future = asyncio.Future()
+    future.set_result(result)
+    return future
+
+
+def dummy_search(self, terms, prelim, sink):
+    sink(copy.deepcopy(first if prelim else fourth))
+
+
+def dummy_async_search(self, terms, prelim, sink):
+    sink(copy.deepcopy(first if prelim else fourth))
+    return done(None)
+
+
+def echo_query(self, terms, data_source_ids):
+    # return a record for each term
+    return done({'data': [{'supplied_name_string': t} for t in terms]})
+
+
+@unittest.skipIf(at is None, 'requires Python 3.5+')
+class AsyncToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        # patch
+        self.true_search = tnr.gnr_tools.GnrResolver.search
+        self.true_async_search = at.AsyncGnrResolver.search
+        self.True_GnrDataSources = tnr.gnr_tools.GnrDataSources
+        tnr.gnr_tools.GnrResolver.search = dummy_search
+        at.AsyncGnrResolver.search = dummy_async_search
+        tnr.gnr_tools.GnrDataSources = Dummy_GnrDataSources
+        self.logger = dummy_Logger()
+        self.loop = asyncio.new_event_loop()
+
+    def tearDown(self):
+        # replace patches
+        tnr.gnr_tools.GnrResolver.search = self.true_search
+        at.AsyncGnrResolver.search = self.true_async_search
+        tnr.gnr_tools.GnrDataSources = self.True_GnrDataSources
+        self.loop.close()
+
+    def test_asyncreadjson(self):
+        res = self.loop.run_until_complete(at.asyncReadJSON(
+            url='not_a_url', logger=self.logger, max_check=1, waittime=0.1))
+        self.assertIsNone(res)
+
+    def test_asyncreadjson_timeout(self):
+        # a server that never answers is given up on
+        server = socket.socket()
+        server.bind(('127.0.0.1', 0))
+        server.listen(1)
+        url = 'http://127.0.0.1:{0}/'.format(server.getsockname()[1])
+        start = time.time()
+        res = self.loop.run_until_complete(at.asyncReadJSON(
+            url=url, logger=self.logger, max_check=1, waittime=0.1,
+            timeout=0.2))
+        server.close()
+        self.assertIsNone(res)
+        self.assertLess(time.time() - start, 5)
+
+    def test_readchunked(self):
+        # the body is read without waiting for the connection to close
+        async def read():
+            reader = asyncio.StreamReader()
+            reader.feed_data(b'4\r\nWiki\r\n5;ext\r\npedia\r\n0\r\n\r\n')
+            return await at._readChunked(reader)
+        self.assertEqual(self.loop.run_until_complete(read()), b'Wikipedia')
+
+    def test_asyncresolver_private_resolve(self):
+        # chunks queried together are returned in the order of terms
+        resolver = at.AsyncGnrResolver(logger=self.logger, inflight=3)
+        resolver._query = echo_query.__get__(resolver)
+        names = ['name{0}'.format(i) for i in range(1050)]
+        res = self.loop.run_until_complete(resolver._resolve(names, [1]))
+        res = [record['supplied_name_string'] for record in res]
+        self.assertEqual(res, names)
+
+    def test_resolver_amain(self):
+        # amain should fill the store as main does, against a mock server,
+        #  with the Resolver's cache and data source configuration
+        tnr.gnr_tools.GnrResolver.search = self.true_search
+        at.AsyncGnrResolver.search = self.true_async_search
+        tnr.gnr_tools.GnrDataSources = self.True_GnrDataSources
+        taxonomy = mock_tools.MockTaxonomy(ngenera=20, nspecies=5)
+        names = taxonomy.names(60, synonyms=0.2, unknown=0.1, seed=1)
+        cachedir = tempfile.mkdtemp()
+        try:
+            with mock_tools.MockGnrServer(taxonomy) as server:
+                kwargs = dict(terms=names, logger=self.logger,
+                              server=server.url, archive=None,
+                              checkpoint=False, chunk_size=7,
+                              ds_concurrency=2)
+                resolver1 = tnr.resolver.Resolver(**kwargs)
+                resolver1.main()
+                requests = []
+                for post, cache in [(True, None), (False, cachedir),
+                                    (False, cachedir)]:
+                    requests.append(server.requests)
+                    resolver2 = tnr.resolver.Resolver(cachedir=cache,
+                                                      post=post, **kwargs)
+                    self.loop.run_until_complete(resolver2.amain(inflight=3))
+                    self.assertEqual(dict(resolver1._store.items()),
+                                     dict(resolver2._store.items()))
+                    self.assertEqual(resolver2._ares.ds_concurrency, 2)
+                requests.append(server.requests)
+                # the last run was answered from the cache
+                self.assertGreater(requests[2], requests[1])
+                self.assertEqual(requests[3], requests[2])
+                self.assertGreater(resolver2._ares.cache.hits, 0)
+                # a Resolver can be run again in another event loop
+                resolver3 = tnr.resolver.Resolver(**kwargs)
+                for loop in [self.loop, asyncio.new_event_loop()]:
+                    loop.run_until_complete(resolver3.amain(inflight=3))
+                    self.assertEqual(dict(resolver1._store.items()),
+                                     dict(resolver3._store.items()))
+                loop.close()
+        finally:
+            shutil.rmtree(cachedir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+#! /usr/bin/env python
+"""
+Tests for cache tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import shutil
+import tempfile
+import time
+from taxon_names_resolver import cache_tools as ct
+
+# TEST DATA
+records = [{'supplied_name_string': 'GenusA speciesA',
+            'results': [{'taxon_id': '1', 'data_source_id': 4},
+                        {'taxon_id': '2', 'data_source_id': 5}]},
+           {'supplied_name_string': 'GenusB speciesB'}]
+
+
+class CacheToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.cachedir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.cachedir)
+
+    def test_normalise(self):
+        self.assertEqual(ct.normalise(' GenusA  speciesA\n'),
+                         'GenusA speciesA')
+
+    def test_resultcache(self):
+        cache = ct.ResultCache(self.cachedir)
+        cache.put(records, [4, 5])
+        # names are normalised, results split by data source
+        res = cache.get(['GenusA  speciesA', 'GenusB speciesB', 'GenusC'],
+                        [5])
+        self.assertEqual(res['GenusA  speciesA']['results'],
+                         [{'taxon_id': '2', 'data_source_id': 5}])
+        # searched names without results are cached too
+        self.assertEqual(res['GenusB speciesB'],
+                         {'supplied_name_string': 'GenusB speciesB'})
+        self.assertNotIn('GenusC', res)
+        # names not searched against every data source are misses
+        self.assertEqual(cache.get(['GenusA speciesA'], [4, 6]), {})
+        self.assertEqual([cache.hits, cache.misses], [2, 2])
+        cache.close()
+
+    def test_resultcache_expiry(self):
+        cache = ct.ResultCache(self.cachedir, ttl=0.05)
+        cache.put(records, [4, 5])
+        time.sleep(0.1)
+        self.assertEqual(cache.get(['GenusA speciesA'], [4]), {})
+        cache.close()
+
+    def test_resultcache_eviction(self):
+        # least recently used are evicted first
+        cache = ct.ResultCache(self.cachedir, max_entries=2)
+        cache.put(records[:1], [4])
+        cache.put(records[1:], [4])
+        cache.get(['GenusA speciesA'], [4])
+        cache.put([{'supplied_name_string': 'GenusC'}], [4])
+        res = cache.get(['GenusA speciesA', 'GenusB speciesB', 'GenusC'], [4])
+        self.assertEqual(sorted(res.keys()), ['GenusA speciesA', 'GenusC'])
+        cache.close()
+
+    def test_resultcache_count(self):
+        # entries are counted as they are put, expired swept now and then
+        cache = ct.ResultCache(self.cachedir, ttl=0.05, sweep_every=3)
+        cache.put(records, [4, 5])
+        cache.put(records + records[:1], [4])
+        self.assertEqual(cache._count, 4)
+        time.sleep(0.1)
+        cache.put([{'supplied_name_string': 'GenusC'}], [4])
+        self.assertEqual(cache._count, 1)
+        cache.close()
+        cache = ct.ResultCache(self.cachedir)
+        self.assertEqual(cache._count, 1)
+        cache.close()
+
+    def test_datasourcestats(self):
+        stats = ct.DataSourceStats(self.cachedir)
+        stats.record(1, queried=1, alt_names=0)
+        stats.record(2, queried=1, alt_names=5, resolved=1)
+        stats.record(3, queried=1, alt_names=2, resolved=2)
+        # yielding first, then unknown, then those that never yield
+        self.assertEqual(stats.order([1, 2, 3, 4]), [3, 2, 4, 1])
+        stats.save()
+        stats = ct.DataSourceStats(self.cachedir)
+        self.assertEqual(stats.stats['2'],
+                         {'queried': 1, 'alt_names': 5, 'resolved': 1})
+
+    def test_negativecache(self):
+        negative = ct.NegativeCache(self.cachedir)
+        negative.add(['GenusA speciesA', 'GenusB speciesB'])
+        negative.discard(['GenusB  speciesB'])
+        negative.save()
+        negative = ct.NegativeCache(self.cachedir)
+        self.assertEqual(negative.known(['GenusA speciesA', 'GenusB speciesB',
+                                         'GenusC']), set(['GenusA speciesA']))
+        # names expire
+        negative.ttl = 0
+        self.assertEqual(negative.known(['GenusA speciesA']), set())
+        # each scope has its own names
+        scoped = ct.NegativeCache(self.cachedir, scope=['NCBI', ['51'], None])
+        self.assertEqual(scoped.known(['GenusA speciesA']), set())
+        scoped.add(['GenusA speciesA'])
+        scoped.save()
+        self.assertEqual(ct.NegativeCache(self.cachedir, scope=[
+            'NCBI', ['51'], None]).known(['GenusA speciesA']),
+            set(['GenusA speciesA']))
+        self.assertEqual(ct.NegativeCache(self.cachedir, scope=[
+            'NCBI', None, None]).known(['GenusA speciesA']), set())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,8 +5,13 @@ Tests for GNR tools
 from __future__ import absolute_import
 
 import unittest
+import copy
 import json
 import os
+import random
+import shutil
+import tempfile
+import time
 from taxon_names_resolver import gnr_tools as gt
 
 # TEST DATA
@@ -87,6 +92,27 @@ def dummy_query(self, terms, data_source_ids):
 Dummy_GnrResolver._query = dummy_query
 
 
+class Echo_GnrResolver(gt.GnrResolver):
+    pass
+
+
+def echo_query(self, terms, data_source_ids):
+    # return a record for each term, slowly and out of order
+    time.sleep(random.random() * 0.01)
+    return {'data': [{'supplied_name_string': t} for t in terms]}
+
+Echo_GnrResolver._query = echo_query
+
+
+class Dummy_Archive(object):
+
+    def __init__(self, archived):
+        self.archived = archived
+
+    def write(self, records):
+        self.archived.extend(records)
+
+
 class GNRToolsTestSuite(unittest.TestCase):
     # no tests for search and write
 
@@ -111,6 +137,44 @@ class GNRToolsTestSuite(unittest.TestCase):
         res2 = test_ds.byName(names=first_ds, invert=True)
         self.assertEqual([res1[0], len(res2)], [1, len(res_sum)-1])
 
+    def test_datasources_cached(self):
+        # catalog is read from cachedir rather than downloaded
+        cachedir = tempfile.mkdtemp()
+        catalog = [{'id': 1, 'title': 'SourceA'}, {'id': 4, 'title': 'NCBI'},
+                   {'id': 2, 'title': 'SourceB'}]
+        with open(os.path.join(cachedir, 'data_sources.json'), 'w') as f:
+            json.dump(catalog, f)
+        test_ds = gt.GnrDataSources(logger=self.logger, cachedir=cachedir)
+        test_ds.url = 'not_a_url'
+        self.assertEqual(test_ds.byName('NCBI'), [4])
+        self.assertEqual(test_ds.byName(['SourceB', 'SourceA']), [1, 2])
+        self.assertEqual(test_ds.byName('NCBI', invert=True), [1, 2])
+        # and kept for the rest of the process
+        test_ds = gt.GnrDataSources(logger=self.logger)
+        test_ds.url = 'not_a_url'
+        self.assertEqual(test_ds.summary()[0], {'id': 1, 'title': 'SourceA'})
+        del gt.GnrDataSources._catalogs['not_a_url']
+        shutil.rmtree(cachedir)
+
+    def test_chunksizer(self):
+        sizer = gt.ChunkSizer(logger=self.logger, size=100, minimum=10,
+                              maximum=200, target=10)
+        # fast full chunks grow size, up to maximum
+        sizer.record(100, 1, True)
+        self.assertEqual(sizer.size, 150)
+        sizer.record(150, 1, True)
+        sizer.record(200, 1, True)
+        self.assertEqual(sizer.size, 200)
+        # fast partial chunks tell us nothing
+        sizer.record(5, 1, True)
+        self.assertEqual(sizer.size, 200)
+        # slow or failed chunks shrink size, down to minimum
+        sizer.record(200, 20, True)
+        self.assertEqual(sizer.size, 100)
+        for i in range(5):
+            sizer.record(100, 1, False)
+        self.assertEqual(sizer.size, 10)
+
     def test_store(self):
         # create test store
         test_store = gt.GnrStore(terms, logger=self.logger)
@@ -124,6 +188,96 @@ class GNRToolsTestSuite(unittest.TestCase):
         res2 = test_store['GenusA speciesA']
         self.assertEqual(res2, [])
 
+    def test_taxonfilter(self):
+        results = [{'classification_path_ids': '|51|41|31'},
+                   {'classification_path_ids': '|52|42|32'},
+                   {'classification_path_ids': '|51|43|33'}]
+        taxfilter = gt.TaxonFilter(include=[51, '52'], exclude=['43'])
+        self.assertEqual(taxfilter.filter(results), results[:2])
+        # decisions are cached by path
+        self.assertEqual(taxfilter._keep, {'|51|41|31': True,
+                                           '|52|42|32': True,
+                                           '|51|43|33': False})
+        self.assertFalse(gt.TaxonFilter())
+        records = [{'supplied_name_string': 'a', 'results': results},
+                   {'supplied_name_string': 'b'}]
+        self.assertEqual(gt.TaxonFilter(exclude=['31']).filterRecords(
+            records), [('a', results[1:])])
+
+    def test_store_exclude(self):
+        store = gt.GnrStore(terms, logger=self.logger, exclude='1')
+        store.add(first)
+        self.assertEqual(store['GenusA speciesA'], [])
+        self.assertNotEqual(store['GenusA speciesB'], [])
+        store.exclude = None
+        store.add(first)
+        self.assertNotEqual(store['GenusA speciesA'], [])
+
+    def test_store_indexes(self):
+        # live sets of terms with no, one and multiple records
+        for store_class in [gt.GnrStore, gt.CompactGnrStore]:
+            store = store_class(terms, logger=self.logger)
+            self.assertEqual(store.unresolved, set(terms))
+            store.add(first)
+            store.add(first[:1])
+            self.assertEqual(store.multiple, set(['GenusA speciesA']))
+            self.assertEqual(len(store.resolved), 8)
+            self.assertEqual(store.unresolved, set(['GenusG speciesJ']))
+            store.replace([{'supplied_name_string': 'GenusA speciesA'}])
+            store.update({'GenusG speciesJ': first[0]['results']})
+            self.assertEqual(store.multiple, set())
+            self.assertEqual(store.unresolved, set(['GenusA speciesA']))
+            del store['GenusA speciesA']
+            self.assertEqual(store.unresolved, set())
+
+    def test_compactstore(self):
+        # acts like a GnrStore
+        store = gt.GnrStore(terms, logger=self.logger, tax_group='51')
+        compact = gt.CompactGnrStore(terms, logger=self.logger,
+                                     tax_group='51')
+        for each in [store, compact]:
+            each.add(first)
+            each.add(third)
+            each.replace([{'supplied_name_string': 'GenusA speciesA'}])
+        self.assertEqual(compact, store)
+        self.assertEqual(sorted(compact.keys()), sorted(store.keys()))
+        # types are kept, results returned are copies
+        result = compact['GenusB speciesE'][0]
+        self.assertEqual(result, store['GenusB speciesE'][0])
+        result['taxon_id'] = 'changed'
+        self.assertNotEqual(compact['GenusB speciesE'][0]['taxon_id'],
+                            'changed')
+        self.assertTrue(compact.report().startswith('Store of [10] names'))
+        # dict methods return results, not the rows holding them
+        self.assertEqual(dict(compact), dict(store))
+        self.assertEqual(compact.pop('GenusB speciesE'),
+                         store.pop('GenusB speciesE'))
+        self.assertEqual(compact.setdefault('GenusA speciesB'),
+                         store['GenusA speciesB'])
+        term, results = compact.popitem()
+        self.assertEqual(results, store[term])
+        self.assertNotIn(term, compact.resolved | compact.unresolved |
+                         compact.multiple)
+        compact.clear()
+        self.assertEqual([len(compact), len(compact.resolved)], [0, 0])
+
+    def test_compactstore_footprint(self):
+        # repeated results are held once, unused rows are dropped
+        names = ['name{0}'.format(i) for i in range(20000)]
+        store = gt.GnrStore(names, logger=self.logger)
+        compact = gt.CompactGnrStore(names, logger=self.logger)
+        results = copy.deepcopy(first[0]['results'])
+        results[0]['unused'] = 'x' * 100
+        for each in [store, compact]:
+            each.add([{'supplied_name_string': name, 'results': results} for
+                      name in names])
+        self.assertLess(compact.footprint(), store.footprint() / 3)
+        self.assertNotIn('unused', compact['name1'][0])
+        for name in names:
+            compact[name] = []
+        self.assertEqual(compact._dead, 0)
+        self.assertEqual(len(compact._columns[0]), 0)
+
     def test_resolver_private_query(self):
         # talk to gnr with small query
         # Humans are 9606 in NCBI
@@ -137,6 +291,140 @@ class GNRToolsTestSuite(unittest.TestCase):
         res = res[0]['supplied_name_string']
         self.assertEqual(res, 'Homo sapiens')
 
+    def test_resolver_private_resolve_concurrent(self):
+        # chunks queried in parallel are returned in the order of terms
+        resolver = Echo_GnrResolver(logger=self.logger, concurrency=4)
+        names = ['name{0}'.format(i) for i in range(1050)]
+        res = resolver._resolve(names, [1])
+        res = [record['supplied_name_string'] for record in res]
+        self.assertEqual(res, names)
+
+    def test_resolver_private_resolve_cache(self):
+        # only names missing from the cache are sent
+        cachedir = tempfile.mkdtemp()
+        resolver = Echo_GnrResolver(logger=self.logger, cachedir=cachedir)
+        resolver._resolve(['name1', 'name2'], [1])
+        sent = []
+
+        def query(terms, data_source_ids):
+            sent.extend(terms)
+            return echo_query(resolver, terms, data_source_ids)
+        resolver._query = query
+        res = resolver._resolve(['name0', 'name1', 'name2', 'name3'], [1])
+        res = [record['supplied_name_string'] for record in res]
+        self.assertEqual(res, ['name0', 'name1', 'name2', 'name3'])
+        self.assertEqual(sent, ['name0', 'name3'])
+        # cached records are passed to sink a chunk at a time
+        names = ['name{0}'.format(i) for i in range(250)]
+        resolver._resolve(names, [1])
+        chunks = []
+        resolver._resolve(names, [1], chunks.append)
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+        resolver.cache.close()
+        shutil.rmtree(cachedir)
+
+    def test_resolver_search_cached_synonyms(self):
+        # synonyms sharing an alternative name both resolve from the cache
+        cachedir = tempfile.mkdtemp()
+        resolver = gt.GnrResolver(logger=self.logger, cachedir=cachedir,
+                                  archive=None)
+        resolver.Id = [1]
+        resolver.otherIds = [2]
+
+        def query(terms, data_source_ids):
+            if list(data_source_ids) == [2]:
+                return {'data': [{'supplied_name_string': t, 'results': [
+                    {'canonical_form': 'X y'}]} for t in terms]}
+            return {'data': [{'supplied_name_string': t, 'results': [
+                {'canonical_form': t}]} for t in terms]}
+        resolver._query = query
+        for _ in range(2):
+            res = resolver.search(['Syn a', 'Syn b'], prelim=False)
+            self.assertEqual(sorted([(record['supplied_name_string'],
+                                      len(record['results'])) for record in
+                                     res]), [('Syn a', 1), ('Syn b', 1)])
+        # records given for repeated terms are not shared
+        res = resolver._resolve(['X y', 'X y'], [1])
+        self.assertEqual(len(res), 2)
+        self.assertIsNot(res[0], res[1])
+        resolver.cache.close()
+        shutil.rmtree(cachedir)
+
+    def test_resolver_private_searchothers(self):
+        # each data source gives an alternative name for every term
+        resolver = Echo_GnrResolver(logger=self.logger, ds_concurrency=2)
+        resolver.otherIds = [1, 2, 3, 4, 5]
+        queried = []
+        archived = []
+
+        def query(terms, data_source_ids):
+            queried.extend(data_source_ids)
+            return {'data': [{'supplied_name_string': t, 'results': [
+                {'canonical_form': '{0} {1}'.format(t, data_source_ids[0])}]}
+                for t in terms]}
+        resolver._query = query
+        archive = Dummy_Archive(archived)
+        alt_terms, sources = resolver._searchOthers(['name1', 'name2'],
+                                                    archive)
+        self.assertEqual(len(archived), 10)
+        self.assertEqual(sorted(queried), [1, 2, 3, 4, 5])
+        self.assertEqual(len(alt_terms), 10)
+        self.assertEqual(sources['name1 3'], set([3]))
+        # with early stop, no more than the first wave is queried
+        resolver.early_stop = True
+        del queried[:]
+        resolver._searchOthers(['name1', 'name2'], archive)
+        self.assertEqual(sorted(queried), [1, 2])
+        # with a cap, no more than max_sources are queried
+        resolver.early_stop = False
+        resolver.max_sources = 3
+        del queried[:]
+        resolver._searchOthers(['name1', 'name2'], archive)
+        self.assertEqual(sorted(queried), [1, 2, 3])
+
+    def test_resolver_private_resolve_continuous(self):
+        # a slow chunk holds up only its own worker, not the next chunks
+        resolver = Echo_GnrResolver(logger=self.logger, concurrency=2)
+
+        def query(terms, data_source_ids):
+            if terms[0] in ('name0', 'name300'):
+                time.sleep(0.3)
+            return echo_query(resolver, terms, data_source_ids)
+        resolver._query = query
+        names = ['name{0}'.format(i) for i in range(400)]
+        start = time.time()
+        res = resolver._resolve(names, [1])
+        # in waves of two chunks, both slow chunks would be waited on in turn
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual([record['supplied_name_string'] for record in res],
+                         names)
+        # but chunks waiting on a slow chunk are capped
+        queried = []
+
+        def slow(terms, data_source_ids):
+            queried.append(terms[0])
+            if terms[0] == 'name0':
+                time.sleep(0.3)
+            return echo_query(resolver, terms, data_source_ids)
+        resolver._query = slow
+        names = ['name{0}'.format(i) for i in range(2000)]
+        held = []
+        resolver._resolve(names, [1], lambda records: held.append(
+            len(queried)))
+        self.assertLessEqual(held[0], 4)
+        self.assertEqual(len(queried), 20)
+
+    def test_resolver_private_resolve_sink(self):
+        # records are passed to sink a chunk at a time
+        resolver = Echo_GnrResolver(logger=self.logger, concurrency=2)
+        chunks = []
+        names = ['name{0}'.format(i) for i in range(250)]
+        self.assertEqual(resolver._resolve(names, [1], chunks.append), [])
+        self.assertEqual([len(chunk) for chunk in chunks], [100, 100, 50])
+        res = [record['supplied_name_string'] for chunk in chunks for record
+               in chunk]
+        self.assertEqual(res, names)
+
     def test_resolver_private_parsename(self):
         # this function finds names that are different
         #  from the supplied name
@@ -0,0 +1,224 @@
+#! /usr/bin/env python
+"""
+Tests for HTTP tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import gzip
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from six.moves import BaseHTTPServer, socketserver
+from taxon_names_resolver import http_tools as ht
+
+
+# STUBS
+class dummy_Logger(object):
+
+    def __init__(self):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def warn(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class Dummy_Handler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # serve gzipped JSON over keep-alive connections, record each client
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.clients.add(self.client_address)
+        if self.path.startswith('/missing'):
+            self.send_response(404)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        body = json.dumps({'path': self.path}).encode('utf8')
+        if 'gzip' in self.headers.get('Accept-Encoding', ''):
+            buf = io.BytesIO()
+            with gzip.GzipFile(fileobj=buf, mode='wb') as f:
+                f.write(body)
+            body = buf.getvalue()
+            self.send_response(200)
+            self.send_header('Content-Encoding', 'gzip')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        length = int(self.headers.get('Content-Length', 0))
+        data = self.rfile.read(length).decode('utf8')
+        body = json.dumps({'path': self.path, 'data': data}).encode('utf8')
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class Dummy_Server(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class HTTPToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.server = Dummy_Server(('127.0.0.1', 0), Dummy_Handler)
+        self.server.clients = set()
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.url = 'http://127.0.0.1:{0}'.format(self.server.server_port)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_connectionpool_request(self):
+        # gzipped responses are decompressed, connections are reused
+        pool = ht.ConnectionPool()
+        for i in range(3):
+            res = pool.request('{0}/test{1}'.format(self.url, i))
+            self.assertEqual(json.loads(res.decode('utf8')),
+                             {'path': '/test{0}'.format(i)})
+        self.assertEqual(len(self.server.clients), 1)
+        pool.close()
+
+    def test_connectionpool_post(self):
+        pool = ht.ConnectionPool()
+        res = pool.request(self.url + '/test', data='names=A|B')
+        self.assertEqual(json.loads(res.decode('utf8')),
+                         {'path': '/test', 'data': 'names=A|B'})
+        pool.close()
+
+    def test_connectionpool_error(self):
+        pool = ht.ConnectionPool()
+        with self.assertRaises(ht.GnrHTTPError) as context:
+            pool.request(self.url + '/missing')
+        self.assertEqual(context.exception.status, 404)
+        pool.close()
+
+
+class RetryTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = dummy_Logger()
+
+    def test_retrypolicy_retry(self):
+        # exponential delays are capped and jittered below the cap
+        policy = ht.RetryPolicy(max_tries=4, base=1, cap=3, jitter=False)
+        self.assertEqual([policy.retry(i) for i in range(4)], [1, 2, 3, None])
+        policy = ht.RetryPolicy(max_tries=10, base=1, cap=3)
+        delays = [policy.retry(i) for i in range(9)]
+        self.assertTrue(all([0 <= e <= 3 for e in delays]))
+        self.assertEqual(policy.retries, 9)
+
+    def test_retrypolicy_budget(self):
+        # budget is shared by all queries of the run
+        policy = ht.RetryPolicy(max_tries=10, base=0, budget=3)
+        self.assertEqual([policy.retry(0) for i in range(4)], [0, 0, 0, None])
+        policy.wait(0.01)
+        self.assertTrue(policy.waited > 0)
+        self.assertTrue(policy.report().startswith('Retried [3] queries'))
+
+    def test_circuitbreaker(self):
+        breaker = ht.CircuitBreaker(self.logger, threshold=2, probe=0.05)
+        breaker.failure()
+        self.assertIsNone(breaker.opened)
+        breaker.failure()
+        self.assertIsNotNone(breaker.opened)
+        # held back until probe, then only one probe at a time
+        start = time.time()
+        breaker.acquire()
+        self.assertTrue(time.time() - start >= 0.04)
+        self.assertTrue(breaker.probing)
+        # failed probe re-opens circuit, successful probe closes it
+        breaker.failure()
+        self.assertFalse(breaker.probing)
+        breaker.acquire()
+        breaker.success()
+        self.assertIsNone(breaker.opened)
+        start = time.time()
+        breaker.acquire()
+        self.assertTrue(time.time() - start < 0.04)
+
+    def test_circuitbreaker_patience(self):
+        breaker = ht.CircuitBreaker(self.logger, threshold=1, probe=0.01,
+                                    patience=0.05)
+        self.assertTrue(breaker.failure())
+        breaker.acquire()
+        breaker.failure()
+        time.sleep(0.06)
+        self.assertRaises(ht.GnrQueryError, breaker.acquire)
+        # client errors do not count against the server
+        policy = ht.RetryPolicy(breaker=ht.CircuitBreaker(self.logger,
+                                                          threshold=1))
+        self.assertFalse(policy.failure(ht.GnrHTTPError('url', 404)))
+        self.assertTrue(policy.failure(ht.GnrHTTPError('url', 503)))
+
+
+class RateLimiterTestSuite(unittest.TestCase):
+
+    def test_ratelimiter_reserve(self):
+        # a burst is free, then queries wait their turn
+        limiter = ht.RateLimiter(requests_per_sec=1, burst=2)
+        waits = [limiter.reserve() for i in range(4)]
+        self.assertEqual(waits[:2], [0, 0])
+        self.assertAlmostEqual(waits[2], 1, places=1)
+        self.assertAlmostEqual(waits[3], 2, places=1)
+        # names are limited too
+        limiter = ht.RateLimiter(requests_per_sec=100, names_per_sec=100)
+        self.assertEqual(limiter.reserve(100), 0)
+        self.assertAlmostEqual(limiter.reserve(50), 0.5, places=1)
+        self.assertTrue(limiter.report().startswith('Rate limited queries'))
+
+    def test_ratelimiter_threads(self):
+        limiter = ht.RateLimiter(requests_per_sec=100, burst=0.01)
+        start = time.time()
+        threads = [threading.Thread(target=lambda: [limiter.acquire() for i
+                                                    in range(5)])
+                   for j in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # 20 queries at 100 a second, less the burst of one
+        self.assertTrue(time.time() - start >= 0.18)
+        self.assertEqual(limiter.threadWaited(), 0)
+
+    @unittest.skipIf(ht.fcntl is None, 'no fcntl')
+    def test_ratelimiter_lockfile(self):
+        # limiters of different processes share buckets through the file
+        directory = tempfile.mkdtemp()
+        lockfile = os.path.join(directory, 'rate.lock')
+        limiter1 = ht.RateLimiter(requests_per_sec=1, burst=10,
+                                  lockfile=lockfile)
+        limiter2 = ht.RateLimiter(requests_per_sec=1, burst=10,
+                                  lockfile=lockfile)
+        waits = [limiter.reserve() for i in range(6) for limiter in
+                 [limiter1, limiter2]]
+        self.assertEqual(waits[:10], [0] * 10)
+        self.assertAlmostEqual(waits[10], 1, places=1)
+        self.assertAlmostEqual(waits[11], 2, places=1)
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    unittest.main()
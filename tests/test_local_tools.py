@@ -0,0 +1,108 @@
+#! /usr/bin/env python
+"""
+Tests for local tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import io
+import os
+import shutil
+import tempfile
+from taxon_names_resolver import local_tools as lt
+from taxon_names_resolver import Resolver
+
+# TEST DATA
+nodes = [(1, 1, 'no rank'), (2, 1, 'superkingdom'), (3, 2, 'no rank'),
+         (4, 3, 'genus'), (5, 4, 'species'), (6, 4, 'species')]
+names = [(1, 'root', 'scientific name'),
+         (2, 'Eukaryota', 'scientific name'),
+         (3, 'Opisthokonta', 'scientific name'),
+         (4, 'Homo', 'scientific name'),
+         (5, 'Homo sapiens', 'scientific name'),
+         (5, 'Homo sapiens Linnaeus, 1758', 'authority'),
+         (6, 'Homo erectus', 'scientific name'),
+         (6, 'Pithecanthropus erectus', 'synonym')]
+
+
+# DUMMIES
+class dummy_Logger(object):
+
+    def __init__(self):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def warn(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class LocalToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = dummy_Logger()
+        self.directory = tempfile.mkdtemp()
+        with io.open(os.path.join(self.directory, 'nodes.dmp'), 'w',
+                     encoding='utf8') as f:
+            for node in nodes:
+                f.write(u'{0}\t|\t{1}\t|\t{2}\t|\tXX\t|\n'.format(*node))
+        with io.open(os.path.join(self.directory, 'names.dmp'), 'w',
+                     encoding='utf8') as f:
+            for name in names:
+                f.write(u'{0}\t|\t{1}\t|\t\t|\t{2}\t|\n'.format(*name))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_canonical(self):
+        self.assertEqual(lt.canonical('Homo sapiens Linnaeus, 1758'),
+                         'Homo sapiens')
+        self.assertEqual(lt.canonical('Ursus arctos subsp. horribilis Ord'),
+                         'Ursus arctos horribilis')
+
+    def test_local_query(self):
+        resolver = lt.LocalGnrResolver(self.logger, self.directory)
+        self.assertEqual(resolver.Id, [4])
+        self.assertEqual(resolver.otherIds, [])
+        res = resolver._query(['Homo sapiens', 'Homo sapiens L.',
+                               'Pithecanthropus erectus', 'Unknown'],
+                              resolver.Id)['data']
+        self.assertEqual(len(res[0]['results']), 1)
+        result = res[0]['results'][0]
+        self.assertEqual(result['classification_path'],
+                         '|Eukaryota|Opisthokonta|Homo|Homo sapiens')
+        self.assertEqual(result['classification_path_ranks'],
+                         '|superkingdom||genus|species')
+        self.assertEqual(result['classification_path_ids'], '|2|3|4|5')
+        self.assertEqual([result['taxon_id'], result['match_type']], ['5', 1])
+        # canonical match scores lower
+        self.assertEqual(res[1]['results'][0]['match_type'], 2)
+        self.assertLess(res[1]['results'][0]['score'], result['score'])
+        # synonyms resolve to their taxon
+        self.assertEqual(res[2]['results'][0]['classification_path_ids'],
+                         '|2|3|4|6')
+        self.assertNotIn('results', res[3])
+        resolver.index.close()
+
+    def test_resolver_local(self):
+        # Resolver works against the local taxonomy unchanged
+        resolver = Resolver(terms=['Homo sapiens', 'Pithecanthropus erectus',
+                                   'Homo unknownus'], taxon_id='3',
+                            logger=self.logger, taxonomy=self.directory,
+                            archive=None)
+        resolver.main()
+        res = dict(zip(resolver.retrieve('query_name'),
+                       resolver.retrieve('taxon_id')))
+        self.assertEqual(res, {'Homo sapiens': '5',
+                               'Pithecanthropus erectus': '6',
+                               'Homo unknownus': '4'})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,127 @@
+#! /usr/bin/env python
+"""
+Tests for mock tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import threading
+from taxon_names_resolver import mock_tools as mt
+from taxon_names_resolver import gnr_tools as gt
+from taxon_names_resolver.http_tools import RetryPolicy
+from taxon_names_resolver.http_tools import CircuitBreaker
+from taxon_names_resolver.http_tools import GnrQueryError
+
+
+# DUMMIES
+class dummy_Logger(object):
+
+    def __init__(self):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def warn(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+class MockToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = dummy_Logger()
+        self.taxonomy = mt.MockTaxonomy(ngenera=10, nspecies=5)
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(mt.percentile(values, 50), 50)
+        self.assertEqual(mt.percentile(values, 99), 99)
+        self.assertEqual(mt.percentile([], 50), None)
+
+    def test_taxonomy(self):
+        res = self.taxonomy.resolve(['Genus1 species2', 'Synonymus1 species2',
+                                     'Genus1', 'Genus11 species2'],
+                                    [4])['data']
+        self.assertEqual(res[0]['results'][0]['classification_path'],
+                         '|Life|Genus1|Genus1 species2')
+        # synonyms are only known to other data sources
+        self.assertNotIn('results', res[1])
+        self.assertEqual(res[2]['results'][0]['classification_path_ranks'],
+                         '|kingdom|genus')
+        self.assertNotIn('results', res[3])
+        res = self.taxonomy.resolve(['Synonymus1 species2'], [100])['data']
+        self.assertEqual(res[0]['results'][0]['canonical_form'],
+                         'Genus1 species2')
+
+    def test_server(self):
+        with mt.MockGnrServer(self.taxonomy) as server:
+            resolver = gt.GnrResolver(self.logger, server=server.url)
+            self.assertEqual(resolver.Id, [4])
+            self.assertEqual(resolver.otherIds, [100, 101])
+            res = resolver._query(['Genus1 species2'], resolver.Id)
+            resolver.post = True
+            self.assertEqual(resolver._query(['Genus1 species2'],
+                                             resolver.Id), res)
+        self.assertEqual(res['data'][0]['results'][0]['taxon_id'], '27')
+        self.assertEqual([server.requests, server.names], [3, 2])
+
+    def test_server_errors(self):
+        policy = RetryPolicy(max_tries=2, base=0, jitter=False)
+        with mt.MockGnrServer(self.taxonomy, error_rate=1.) as server:
+            resolver = gt.GnrResolver(self.logger, server=server.url,
+                                      policy=policy)
+            self.assertEqual(resolver._query(['Genus1'], [4]), None)
+        self.assertEqual([server.errors, policy.retries], [2, 1])
+
+    def test_server_outage(self):
+        # queries held by the breaker wait out an outage without using up
+        #  their tries
+        breaker = CircuitBreaker(self.logger, threshold=1, probe=0.02)
+        policy = RetryPolicy(max_tries=2, base=0, jitter=False,
+                             breaker=breaker)
+        with mt.MockGnrServer(self.taxonomy, error_rate=1.) as server:
+            resolver = gt.GnrResolver(self.logger, server=server.url,
+                                      policy=policy)
+            resolver.Id = [4]
+            timer = threading.Timer(0.2, setattr, [server, 'error_rate', 0.])
+            timer.start()
+            res = resolver._resolveChunks(['Genus1 species2'], [4])
+            timer.join()
+        self.assertEqual(res[0]['results'][0]['taxon_id'], '27')
+        self.assertGreater(server.errors, 2)
+
+    def test_server_down(self):
+        # a query that gives up raises a clear error
+        breaker = CircuitBreaker(self.logger, threshold=1, probe=0.01,
+                                 patience=0.1)
+        policy = RetryPolicy(max_tries=2, base=0, jitter=False,
+                             breaker=breaker)
+        with mt.MockGnrServer(self.taxonomy, error_rate=1.) as server:
+            resolver = gt.GnrResolver(self.logger, server=server.url,
+                                      policy=policy)
+            resolver.Id = [4]
+            self.assertRaises(GnrQueryError, resolver._resolveChunks,
+                              ['Genus1 species2'], [4])
+
+    def test_benchmark(self):
+        terms = self.taxonomy.names(200, synonyms=0.1, unknown=0.1, seed=1)
+        latency = mt.lognormalLatency(0.001, seed=1)
+        policy = RetryPolicy(base=0, jitter=False)
+        with mt.MockGnrServer(self.taxonomy, latency=latency, error_rate=0.1,
+                              seed=1) as server:
+            res = mt.benchmark(terms, server, logger=self.logger,
+                               concurrency=2, chunk_size=10, policy=policy)
+        # every name resolves, by synonym or genus if need be
+        self.assertEqual(res['resolved'], res['names'])
+        self.assertEqual(res['retries'], res['errors'])
+        self.assertGreater(res['chunks'], 0)
+        self.assertLessEqual(res['p50'], res['p99'])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -5,9 +5,11 @@ Tests for Resolver
 from __future__ import absolute_import
 
 import unittest
+import copy
 import json
 import os
 import shutil
+import tempfile
 import taxon_names_resolver as tnr
 import six
 
@@ -54,16 +56,16 @@ class dummy_Logger(object):
 
 
 # redefining the unbound search method...
-def dummy_search(self, terms, prelim):
+def dummy_search(self, terms, prelim, sink):
     if prelim:
-        return first
+        sink(copy.deepcopy(first))
     else:
-        return fourth
+        sink(copy.deepcopy(fourth))
 
 
 # add the datasources to prevent talking to GNR
 class Dummy_GnrDataSources(object):
-    def __init__(self, logger):
+    def __init__(self, logger, **kwargs):
         pass
 
     def byName(self, names, invert=False):
@@ -167,6 +169,184 @@ GenusE speciesH,GenusE speciesH,|51|42|33|24|15|8,3|0|0,1,8,test_number8']
         res = list(self.resolver1._store.keys())
         self.assertEqual(len(res), 10)
 
+    def test_resolver_retrievemany(self):
+        for compact in [False, True]:
+            resolver = tnr.resolver.Resolver(terms=terms, taxon_id='51',
+                                             logger=self.logger,
+                                             compact=compact)
+            resolver.main()
+            key_terms = ['query_name', 'classification_path', 'taxon_id']
+            res = resolver.retrieveMany(key_terms)
+            self.assertEqual([[list(path) for path in column] if
+                              'path' in key_term else column for key_term,
+                              column in zip(key_terms, res)],
+                             [resolver.retrieve(e) for e in key_terms])
+            # split paths are cached and cannot be changed
+            path = resolver.retrieveMany(['classification_path'])[0][0]
+            self.assertIs(path, res[1][0])
+            self.assertIsInstance(path, tuple)
+        self.assertRaises(IndexError, resolver.retrieveMany, ['taxon_id',
+                                                              'not_a_term'])
+
+    def test_resolver_main_compact(self):
+        resolver = tnr.resolver.Resolver(terms=terms, taxon_id='51',
+                                         logger=self.logger, compact=True)
+        resolver.main()
+        self.resolver1.main()
+        self.assertEqual(resolver._store, self.resolver1._store)
+        self.assertEqual(resolver.retrieve('taxon_id'),
+                         self.resolver1.retrieve('taxon_id'))
+
+    def test_resolver_main_stream(self):
+        # names streamed as they resolve match those written at the end
+        outdir = tempfile.mkdtemp()
+        stream = tnr.writer_tools.ResultWriter(os.path.join(outdir, 'a'))
+        flushed = []
+        stream_flush = stream.flush
+
+        def flush():
+            flushed.append(stream.nresolved)
+            stream_flush()
+        stream.flush = flush
+        resolver = tnr.resolver.Resolver(terms=terms, taxon_id='51',
+                                         logger=self.logger, stream=stream)
+        resolver.main()
+        resolver.write(os.path.join(outdir, 'b'))
+        for filename in ['search_results.csv', 'unresolved.txt']:
+            res = []
+            for name in ['a', 'b']:
+                path = os.path.join(outdir, name, filename)
+                lines = None
+                if os.path.isfile(path):
+                    with open(path) as file:
+                        lines = sorted(file.readlines())
+                res.append(lines)
+            self.assertEqual(res[0], res[1])
+        self.assertEqual(stream.nresolved + stream.nunresolved, len(terms))
+        # names are flushed at the end of each search
+        self.assertGreater(len(flushed), 0)
+        self.assertEqual(flushed[-1], stream.nresolved)
+        shutil.rmtree(outdir)
+
+    def test_resolver_main_minscore(self):
+        # names with no record scoring high enough are unresolved
+        sieve = tnr.sieve_tools.Sieve(filters=[
+            tnr.sieve_tools.MinScore(2)])
+        resolver = tnr.resolver.Resolver(terms=terms, taxon_id='51',
+                                         logger=self.logger, sieve=sieve)
+        resolver.main()
+        self.assertEqual(resolver.retrieve('taxon_id'), [])
+
+    def test_resolver_main_negative(self):
+        # names unresolved by a previous run skip the fallback searches
+        searches = []
+
+        def search(self, terms, prelim, sink):
+            searches.append(prelim)
+            if prelim and len(terms) > 1:
+                sink(copy.deepcopy(first))
+        tnr.gnr_tools.GnrResolver.search = search
+        cachedir = tempfile.mkdtemp()
+        for refresh, nsearches in [(False, 4), (False, 1), (True, 4)]:
+            del searches[:]
+            resolver = tnr.resolver.Resolver(
+                terms=terms, taxon_id='51', logger=self.logger,
+                cachedir=cachedir, refresh=refresh)
+            resolver.main()
+            self.assertEqual(len(searches), nsearches)
+        self.assertEqual(list(resolver._negative.names.keys()),
+                         ['GenusG speciesJ'])
+        # names unresolved within a taxon are searched again without it
+        del searches[:]
+        resolver = tnr.resolver.Resolver(terms=terms, logger=self.logger,
+                                         cachedir=cachedir)
+        resolver.main()
+        self.assertEqual(len(searches), 4)
+        shutil.rmtree(cachedir)
+
+    def test_resolver_main_genera(self):
+        # each genus is searched once, its results go to all its species
+        searches = []
+        genus = {'supplied_name_string': 'GenusA',
+                 'results': [dict(first[0]['results'][0],
+                                  classification_path_ids='|51|41|31|21|11')]}
+
+        def search(self, terms, prelim, sink):
+            searches.append(list(terms))
+            if len(searches) == 3:
+                sink([copy.deepcopy(genus)])
+        tnr.gnr_tools.GnrResolver.search = search
+        names = ['GenusA speciesX', 'GenusA speciesY', 'GenusA speciesZ']
+        resolver = tnr.resolver.Resolver(terms=names, taxon_id='51',
+                                         logger=self.logger)
+        resolver.main()
+        self.assertEqual(searches[2], ['GenusA'])
+        self.assertEqual(len(searches), 3)
+        for name in names:
+            self.assertEqual(resolver._store[name], genus['results'])
+
+    def test_resolver_main_resume(self):
+        # a run that dies is resumed without searching names again
+        searches = []
+
+        def search(self, terms, prelim, sink):
+            searches.append(list(terms))
+            records = [record for record in copy.deepcopy(first) if
+                       record['supplied_name_string'] in terms]
+            sink(records[:5])
+            if len(searches) == 1:
+                raise RuntimeError('killed')
+            sink(records[5:])
+        tnr.gnr_tools.GnrResolver.search = search
+        outdir = tempfile.mkdtemp()
+        resolver = tnr.resolver.Resolver(terms=terms, taxon_id='51',
+                                         logger=self.logger, resume=outdir)
+        self.assertRaises(RuntimeError, resolver.main)
+        done = [record['supplied_name_string'] for record in first if
+                record['supplied_name_string'] in searches[0]][:5]
+        resolver = tnr.resolver.Resolver(logger=self.logger, taxon_id='51',
+                                         resume=outdir)
+        self.assertEqual(sorted(resolver.terms), sorted(terms))
+        resolver.main()
+        self.assertEqual(sorted(searches[1]), sorted(set(terms) - set(done)))
+        self.resolver1.main()
+        self.assertEqual(resolver._store, self.resolver1._store)
+        self.assertFalse(os.path.isfile(os.path.join(outdir,
+                                                     'checkpoint.json')))
+        # nothing left to resume and no names to start afresh with
+        self.assertRaises(ValueError, tnr.resolver.Resolver,
+                          logger=self.logger, resume=outdir)
+        shutil.rmtree(outdir)
+
+    def test_resolverpool(self):
+        # jobs with the same taxon are searched together, names once
+        searches = []
+
+        def search(self, terms, prelim, sink):
+            searches.append(list(terms))
+            dummy_search(self, terms, prelim, sink)
+        tnr.gnr_tools.GnrResolver.search = search
+        outdir = tempfile.mkdtemp()
+        pool = tnr.ResolverPool(logger=self.logger, outdir=outdir)
+        pool.add('a', terms=terms[:6], taxon_id='51')
+        pool.add('b', terms=terms[4:], taxon_id='51')
+        pool.add('c', terms=terms[:2])
+        pool.run()
+        self.assertEqual(sorted(searches[0]), sorted(terms))
+        self.assertIs(pool.resolvers['a'], pool.resolvers['b'])
+        self.assertIsNot(pool.resolvers['a'], pool.resolvers['c'])
+        for name, job_terms in [('a', terms[:6]), ('b', terms[4:]),
+                                ('c', terms[:2])]:
+            with open(os.path.join(outdir, name, 'search_results.csv')) as f:
+                rows = [line.split(',')[0] for line in f][1:]
+            unresolved = []
+            path = os.path.join(outdir, name, 'unresolved.txt')
+            if os.path.isfile(path):
+                with open(path) as f:
+                    unresolved = [line.strip() for line in f]
+            self.assertEqual(sorted(rows + unresolved), sorted(job_terms))
+        shutil.rmtree(outdir)
+
     def test_resolver_private_sieve(self):
         # filter the multiple records
         # first replace the multiple records in the store
@@ -175,6 +355,12 @@ GenusE speciesH,GenusE speciesH,|51|42|33|24|15|8,3|0|0,1,8,test_number8']
         res = self.resolver2._sieve(multi_records)
         res = [len(each['results']) == 1 for each in res]
         self.assertTrue(all(res))
+        # lowrank is honoured when set after construction
+        res = self.resolver2._sieve(['GenusF speciesI'])
+        self.assertEqual(res[0]['results'][0]['classification_path_ranks'],
+                         '|kingdom|phylum|order|family|genus|species')
+        self.resolver2.lowrank = True
+        self.assertTrue(self.resolver2.sieve.lowrank)
 
 if __name__ == '__main__':
     unittest.main()
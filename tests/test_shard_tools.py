@@ -0,0 +1,128 @@
+#! /usr/bin/env python
+"""
+Tests for shard tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import copy
+import json
+import os
+import shutil
+import tempfile
+import taxon_names_resolver as tnr
+from taxon_names_resolver import shard_tools as st
+
+# TEST DATA
+with open(os.path.join(os.path.dirname(__file__), 'data',
+          'test_firstsearch.json'), 'r') as file:
+    first = json.load(file)
+terms = [record['supplied_name_string'] for record in first]
+
+
+# DUMMIES
+class dummy_Logger(object):
+
+    def __init__(self):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def debug(self, msg):
+        pass
+
+    def warn(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+
+def dummy_search(self, terms, prelim, sink):
+    dummy_search.searches.append(list(terms))
+    if prelim:
+        sink([record for record in copy.deepcopy(first) if
+              record['supplied_name_string'] in terms])
+dummy_search.searches = []
+
+
+class Dummy_GnrDataSources(object):
+    def __init__(self, logger, **kwargs):
+        pass
+
+    def byName(self, names, invert=False):
+        if invert:
+            return [1, 2, 3]
+        else:
+            return [4]
+
+
+class ShardToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.true_search = tnr.gnr_tools.GnrResolver.search
+        self.True_GnrDataSources = tnr.gnr_tools.GnrDataSources
+        tnr.gnr_tools.GnrResolver.search = dummy_search
+        tnr.gnr_tools.GnrDataSources = Dummy_GnrDataSources
+        self.logger = dummy_Logger()
+        self.outdir = tempfile.mkdtemp()
+        del dummy_search.searches[:]
+
+    def tearDown(self):
+        tnr.gnr_tools.GnrResolver.search = self.true_search
+        tnr.gnr_tools.GnrDataSources = self.True_GnrDataSources
+        shutil.rmtree(self.outdir)
+
+    def test_shardof(self):
+        # shards are stable and ignore whitespace
+        self.assertEqual(st.shardOf('GenusA speciesA', 4),
+                         st.shardOf(' GenusA  speciesA', 4))
+        shards = st.splitShards(terms, 3)
+        self.assertEqual(sorted([t for shard in shards for t in shard]),
+                         sorted(terms))
+        for i, shard in enumerate(shards):
+            self.assertTrue(all([st.shardOf(t, 3) == i for t in shard]))
+
+    def test_resolveshards(self):
+        st.resolveShards(terms, 3, self.outdir, processes=1,
+                         logger=self.logger, taxon_id='51')
+        # compare with resolving in one go
+        resolver = tnr.Resolver(terms=terms, taxon_id='51',
+                                logger=self.logger, checkpoint=False)
+        resolver.main()
+        single = os.path.join(self.outdir, 'single')
+        resolver.write(single, sorted(terms))
+        for filename in ['search_results.csv', 'unresolved.txt']:
+            with open(os.path.join(self.outdir, filename)) as file:
+                merged = file.read()
+            with open(os.path.join(single, filename)) as file:
+                self.assertEqual(merged, file.read())
+        # complete shards are not searched again
+        del dummy_search.searches[:]
+        st.resolveShards(terms, 3, self.outdir, processes=1,
+                         logger=self.logger, taxon_id='51')
+        self.assertEqual(dummy_search.searches, [])
+
+    def test_resolveshard_changed(self):
+        # a checkpoint of other names is not resumed
+        shard_dir = st.shardDir(0, 1, self.outdir)
+        resolver = tnr.Resolver(terms=['Old name'], resume=shard_dir,
+                                logger=self.logger)
+        resolver._checkpoint.save({
+            'terms': ['Old name'], 'nsearch': 1, 'primary': True,
+            'search_terms': ['Old name'], 'renames': [], 'known': [],
+            'store': {'Old name': []}, 'write_counter': 1})
+        st.resolveShard(terms, 0, 1, self.outdir, logger=self.logger)
+        with open(os.path.join(shard_dir, 'search_results.csv')) as file:
+            names = [line.split(',')[0] for line in file][1:]
+        with open(os.path.join(shard_dir, 'unresolved.txt')) as file:
+            names.extend([line.strip() for line in file])
+        self.assertEqual(sorted(names), sorted(terms))
+
+    def test_mergeshards_incomplete(self):
+        st.resolveShard(terms, 0, 2, self.outdir, logger=self.logger)
+        self.assertRaises(IOError, st.mergeShards, 2, self.outdir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,97 @@
+#! /usr/bin/env python
+"""
+Tests for sieve tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import json
+import os
+import random
+from taxon_names_resolver import sieve_tools as st
+
+# TEST DATA
+with open(os.path.join(os.path.dirname(__file__), 'data',
+          'test_multiple.json'), 'r') as file:
+    multiple = json.load(file)
+store = dict([(record['supplied_name_string'], record['results']) for
+              record in multiple])
+terms = sorted(store.keys())
+
+
+def legacySieve(results, lowrank):
+    # selection of the sieve this replaced: best score, then lowest rank
+    #  and deepest path, then first
+    ranks = st.RANKS
+    while len(results) > 1:
+        scores = [result['score'] for result in results]
+        results = [r for r, s in zip(results, scores) if s == max(scores)]
+        if lowrank and len(results) > 1:
+            res_ranks = [result['classification_path_ranks'].split('|') for
+                         result in results]
+            nmd_rnks = [min([j for j, e in enumerate(ranks) if e in rs]) for
+                        rs in res_ranks]
+            unnmd_rnks = [rs.index(ranks[n]) - len(rs) if n == min(nmd_rnks)
+                          else 0 for n, rs in zip(nmd_rnks, res_ranks)]
+            results = [r for r, u in zip(results, unnmd_rnks) if
+                       u == min(unnmd_rnks)]
+        results = [results[0]]
+    return results
+
+
+def randomResults(rng, n):
+    paths = ['|kingdom|phylum|order|family|genus|species',
+             '|kingdom|phylum|order|family|genus',
+             '|kingdom|phylum|order|family|genus|species|',
+             '|kingdom|phylum|order|family', '|kingdom|genus']
+    return [{'score': rng.choice([0.5, 0.9, 1.0]), 'id': i,
+             'classification_path_ranks': rng.choice(paths),
+             'data_source_id': rng.choice([1, 4, 11])} for i in range(n)]
+
+
+class SieveToolsTestSuite(unittest.TestCase):
+
+    def test_ranktable(self):
+        table = st.RankTable()
+        species = {'classification_path_ranks': '|kingdom|genus|species'}
+        genus = {'classification_path_ranks': '|kingdom|genus'}
+        deeper = {'classification_path_ranks': '|kingdom|genus|species|'}
+        unknown = {'classification_path_ranks': '|clade'}
+        self.assertGreater(table(species), table(genus))
+        self.assertGreater(table(deeper), table(species))
+        self.assertGreater(table(genus), table(unknown))
+
+    def test_sieve(self):
+        res = st.Sieve().sieve(store, terms)
+        self.assertEqual([len(record['results']) for record in res], [1, 1])
+        self.assertEqual(res[0]['results'][0]['score'], 1.0)
+        # first returned of equal score, unless lowrank
+        self.assertEqual(res[1]['results'][0], store[terms[1]][0])
+        res = st.Sieve(lowrank=True).sieve(store, terms[1:])
+        self.assertEqual(res[0]['results'][0]['classification_path_ranks'],
+                         '|kingdom|phylum|order|family|genus|species')
+
+    def test_sieve_legacy(self):
+        # same choices as the sieve this replaced
+        rng = random.Random(1)
+        for lowrank in [False, True]:
+            sieve = st.Sieve(lowrank=lowrank)
+            for n in range(20):
+                results = randomResults(rng, n)
+                self.assertEqual(sieve.select(results),
+                                 legacySieve(results, lowrank))
+
+    def test_strategies(self):
+        rng = random.Random(2)
+        results = randomResults(rng, 30)
+        sieve = st.Sieve(keys=[st.PreferSources([11, 4]), st.scoreKey],
+                         filters=[st.MinScore(0.9)])
+        best = sieve.select(results)[0]
+        self.assertEqual(best['data_source_id'], 11)
+        self.assertEqual(best['score'], max([r['score'] for r in results if
+                                             r['data_source_id'] == 11]))
+        self.assertEqual(st.Sieve(filters=[st.MinScore(2)]).sieve(
+            store, terms), [{'supplied_name_string': term} for term in terms])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+#! /usr/bin/env python
+"""
+Tests for writer tools
+"""
+from __future__ import absolute_import
+
+import unittest
+import csv
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import zlib
+from taxon_names_resolver import writer_tools as wt
+
+# TEST DATA
+with open(os.path.join(os.path.dirname(__file__), 'data',
+          'test_multiple.json'), 'r') as file:
+    multiple = json.load(file)
+
+
+class WriterToolsTestSuite(unittest.TestCase):
+
+    def setUp(self):
+        self.outdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.outdir)
+
+    def _write(self, **kwargs):
+        writer = wt.ResultWriter(self.outdir, **kwargs)
+        for record in multiple:
+            writer.write(record['supplied_name_string'], record['results'])
+        writer.write('Unknown name', [])
+        writer.close()
+        return writer
+
+    def test_csv(self):
+        writer = self._write()
+        with open(writer.path) as file:
+            rows = list(csv.reader(file))
+        self.assertEqual(rows[0], wt.KEY_TERMS)
+        self.assertEqual([row[0] for row in rows[1:]],
+                         ['GenusA speciesB', 'GenusF speciesI'])
+        self.assertEqual(rows[1][4], '1.0')
+        with open(writer.txt_path) as file:
+            self.assertEqual(file.read(), 'Unknown name\n')
+        self.assertEqual([writer.nresolved, writer.nunresolved], [2, 1])
+
+    def test_tsv_gzip_all_records(self):
+        writer = self._write(fmt='tsv', compress=True, all_records=True)
+        self.assertTrue(writer.path.endswith('search_results.tsv.gz'))
+        with gzip.open(writer.path, 'rb') as file:
+            rows = [line.decode('utf8').rstrip('\r\n').split('\t') for line
+                    in file]
+        self.assertEqual(len(rows), 5)
+        self.assertEqual(rows[3][5], '|kingdom|phylum|order|family|genus|'
+                         'species')
+
+    def test_ndjson(self):
+        writer = self._write(fmt='ndjson', compress=True)
+        with gzip.open(writer.path, 'rb') as file:
+            records = [json.loads(line.decode('utf8')) for line in file]
+        self.assertEqual(records[0]['results'], multiple[0]['results'][:1])
+        self.assertEqual(records[-1], {'supplied_name_string': 'Unknown name'})
+
+    def test_flush(self):
+        # names can be read before the writer is closed
+        writer = wt.ResultWriter(self.outdir, fmt='ndjson', compress=True,
+                                 flush_every=1)
+        writer.write('GenusA speciesB', multiple[0]['results'])
+        with open(writer.path, 'rb') as file:
+            text = zlib.decompressobj(16 + zlib.MAX_WBITS).decompress(
+                file.read())
+        self.assertEqual(len(text.splitlines()), 1)
+        writer.close()
+        # no unresolved file if all names resolved
+        self.assertFalse(os.path.isfile(writer.txt_path))
+        self.assertRaises(ValueError, wt.ResultWriter, self.outdir,
+                          fmt='xml')
+
+if __name__ == '__main__':
+    unittest.main()